@@ -0,0 +1,369 @@
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from agents import metrics
+from agents.db import connection
+from agents.rollup import EXCLUDED_SQL
+
+
+# Spending analytics over an in-memory, columnar copy of `transactions`, so
+# the agent and the dashboard get precomputed answers instead of the LLM
+# writing ad-hoc SQL. The first call COPYs the table into a pandas frame
+# (datetime dates, float amounts, categorical category/merchant columns; the
+# merchant is the normalized column from migration 8).
+# Later calls compare the data version: if only inserts happened since the
+# last load, just the rows above the id watermark are fetched and appended;
+# an UPDATE/DELETE/TRUNCATE (data_version.rewrite_version, migration 6) or a
+# row count that doesn't add up means a full reload. The watermark is the
+# highest id loaded rather than the latest date, because statements are often
+# imported out of order and a back-dated row has a new id but an old date.
+# Results are memoized per loaded version and day: the analyses measure
+# windows back from today, so a result can go stale without any write. The
+# memo is a small LRU and arguments are clamped and rounded first, so callers
+# can't grow it without bound.
+
+LOAD_SQL = f"""
+    COPY (
+        SELECT id, date, amount::float8, coalesce(category, ''), coalesce(merchant, ''),
+               (category_norm NOT IN ({EXCLUDED_SQL}))::int
+        FROM transactions
+        WHERE date IS NOT NULL AND amount IS NOT NULL AND id > {{after}} AND id <= {{upto}}
+        ORDER BY id
+    ) TO STDOUT (FORMAT csv)
+"""
+
+COUNT_SQL = """
+    SELECT count(*), coalesce(max(id), 0) FROM transactions
+    WHERE date IS NOT NULL AND amount IS NOT NULL
+"""
+
+COLUMNS = ["id", "date", "amount", "category", "merchant", "is_spend"]
+
+# (name, median gap in days lower bound, upper bound, days per period)
+CADENCES = [
+    ("weekly", 6, 8, 7),
+    ("fortnightly", 13, 16, 14),
+    ("monthly", 26, 35, 30.44),
+    ("quarterly", 85, 97, 91.3),
+    ("yearly", 350, 380, 365.25),
+]
+
+Snapshot = namedtuple("Snapshot", "version rewrite_version max_id frame results")
+
+_snapshot = None
+_load_lock = threading.Lock()  # one loader at a time; readers never wait on it for a current snapshot
+_results_lock = threading.Lock()
+
+EVENTS_METRIC = "financebot_analytics_events_total"
+EVENTS = ("full_loads", "incremental_loads", "rows_appended", "result_hits", "result_misses")
+
+_last_load_seconds = 0.0
+
+
+def _results_size() -> int:
+    return int(os.getenv("ANALYTICS_RESULTS_SIZE", "128"))
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def analytics_stats() -> dict:
+    snap = _snapshot
+    stats = metrics.counts(EVENTS_METRIC, EVENTS)
+    stats["last_load_seconds"] = _last_load_seconds
+    stats["version"] = snap.version if snap else None
+    stats["rows"] = len(snap.frame) if snap else 0
+    stats["memory_bytes"] = int(snap.frame.memory_usage(deep=True).sum()) if snap else 0
+    return stats
+
+
+def _versions(conn):
+    row = conn.execute("SELECT version, rewrite_version FROM data_version WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def _read(conn, after: int, upto: int) -> pd.DataFrame:
+    buf = io.BytesIO()
+    with conn.cursor().copy(LOAD_SQL.format(after=int(after), upto=int(upto))) as copy:
+        for data in copy:
+            buf.write(data)
+    buf.seek(0)
+    return _frame(pd.read_csv(buf, names=COLUMNS, keep_default_na=False,
+                              dtype={"id": "int64", "amount": "float64", "category": "category",
+                                     "merchant": "category", "is_spend": "int8"}))
+
+
+def _frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the derived columns the analyses use to rows read as COLUMNS."""
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    df["is_spend"] = df["is_spend"].astype(bool)
+    df["month"] = (df["date"].dt.year * 12 + df["date"].dt.month - 1).astype("int32")
+    df["spend"] = np.where(df["is_spend"], df["amount"].abs(), 0.0)
+    return df
+
+
+def _append(frame: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    if new.empty:
+        return frame
+    # concat keeps categorical columns only when both sides share categories
+    frame = frame.copy(deep=False)
+    for col in ("category", "merchant"):
+        categories = frame[col].cat.categories.union(new[col].cat.categories)
+        frame[col] = frame[col].cat.set_categories(categories)
+        new[col] = new[col].cat.set_categories(categories)
+    return pd.concat([frame, new], ignore_index=True)
+
+
+def _refresh(conn, snap):
+    global _last_load_seconds
+    start = time.perf_counter()
+    with conn.transaction():
+        # one snapshot for the versions, the count and the rows
+        conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        version, rewrite_version = _versions(conn)
+        count, max_id = conn.execute(COUNT_SQL).fetchone()
+        frame = None
+        if snap is not None and snap.rewrite_version == rewrite_version and max_id >= snap.max_id:
+            new = _read(conn, snap.max_id, max_id)
+            # ids are assigned before commit, so a slow insert can land below the watermark
+            if len(snap.frame) + len(new) == count:
+                frame = _append(snap.frame, new)
+                mode = "incremental"
+                _incr("incremental_loads")
+                _incr("rows_appended", len(new))
+        if frame is None:
+            frame = _read(conn, 0, max_id)
+            mode = "full"
+            _incr("full_loads")
+    elapsed = time.perf_counter() - start
+    metrics.observe("financebot_analytics_refresh_seconds", elapsed, mode=mode)
+    _last_load_seconds = round(elapsed, 3)
+    return Snapshot(version, rewrite_version, max_id, frame, LRUCache(maxsize=_results_size()))
+
+
+def snapshot() -> Snapshot:
+    """The frame for the current data version, loading or appending as needed."""
+    global _snapshot
+    with connection() as conn:
+        version, _ = _versions(conn)
+        snap = _snapshot
+        if snap is not None and snap.version == version:
+            return snap
+        with _load_lock:
+            snap = _snapshot
+            if snap is None or snap.version != version:
+                snap = _snapshot = _refresh(conn, snap)
+            return snap
+
+
+def _memoized(name, fn, *args):
+    snap = snapshot()
+    key = (name, date.today()) + args
+    with _results_lock:
+        result = snap.results.get(key)
+    _incr("result_hits" if result is not None else "result_misses")
+    if result is None:
+        with metrics.timed("financebot_analytics_duration_seconds", analysis=name):
+            result = fn(snap.frame, *args)
+        with _results_lock:
+            snap.results[key] = result
+    return result
+
+
+def _month_label(m: int) -> str:
+    return f"{m // 12:04d}-{m % 12 + 1:02d}"
+
+
+def parse_month(value: str) -> int:
+    """'2025-09', 'Sep 2025' or 'September 2025' -> month index (year * 12 + month - 1)."""
+    text = (value or "").strip()
+    for fmt in ("%Y-%m", "%b %Y", "%B %Y"):
+        try:
+            d = datetime.strptime(text, fmt)
+            return d.year * 12 + d.month - 1
+        except ValueError:
+            continue
+    raise ValueError(f"invalid month {value!r}; use YYYY-MM")
+
+
+def _current_month() -> int:
+    today = date.today()
+    return today.year * 12 + today.month - 1
+
+
+def _r(x) -> float:
+    return round(float(x), 2)
+
+
+# --- Analyses ---
+# Each takes the frame and plain arguments and returns a small JSON-able dict.
+
+def _monthly_summary(df, months):
+    last = _current_month()
+    first = last - months + 1
+    spend = df[df["is_spend"]]
+    # three extra months so the first rolling averages are complete
+    window = spend[(spend["month"] >= first - 2) & (spend["month"] <= last)]
+    totals = window.groupby("month")["spend"].agg(["sum", "count"]).reindex(
+        range(first - 2, last + 1), fill_value=0)
+    rolling = totals["sum"].rolling(3, min_periods=1).mean()
+    change = totals["sum"].pct_change().replace([np.inf, -np.inf], np.nan)
+    rows = []
+    for m in range(first, last + 1):
+        rows.append({
+            "month": _month_label(m),
+            "total": _r(totals.at[m, "sum"]),
+            "count": int(totals.at[m, "count"]),
+            "rolling_3m": _r(rolling.at[m]),
+            "change_pct": None if pd.isna(change.at[m]) else round(float(change.at[m]) * 100, 1),
+        })
+    totals_in_range = totals.loc[first:last, "sum"]
+    return {
+        "months": rows,
+        "average": _r(totals_in_range.mean()),
+        "highest": max(rows, key=lambda r: r["total"])["month"] if rows else None,
+    }
+
+
+def _category_breakdown(df, month, months, top):
+    last = _current_month() if month is None else month
+    first = last - months + 1
+    spend = df[df["is_spend"]]
+    window = spend[(spend["month"] >= first) & (spend["month"] <= last)]
+    # baseline: the same number of months just before the window, per month
+    before = spend[(spend["month"] >= first - 3) & (spend["month"] < first)]
+    by_cat = window.groupby("category", observed=True)["spend"].agg(["sum", "count", "mean"])
+    by_cat = by_cat.sort_values("sum", ascending=False)
+    baseline = before.groupby("category", observed=True)["spend"].sum() / 3 * months
+    total = float(by_cat["sum"].sum())
+    rows = []
+    for category, r in by_cat.head(top).iterrows():
+        prev = float(baseline.get(category, 0.0))
+        rows.append({
+            "category": category or "(none)",
+            "total": _r(r["sum"]),
+            "count": int(r["count"]),
+            "avg_txn": _r(r["mean"]),
+            "share_pct": round(float(r["sum"]) / total * 100, 1) if total else 0.0,
+            "vs_prev_3m_pct": round((float(r["sum"]) - prev) / prev * 100, 1) if prev else None,
+        })
+    rest = by_cat.iloc[top:]
+    return {
+        "from": _month_label(first),
+        "to": _month_label(last),
+        "total": _r(total),
+        "categories": rows,
+        "other": {"categories": len(rest), "total": _r(rest["sum"].sum())} if len(rest) else None,
+    }
+
+
+def _recurring(df, min_occurrences, limit):
+    today = pd.Timestamp(date.today())
+    d = df.loc[df["merchant"] != "", ["date", "amount", "merchant", "category"]]
+    d = d.assign(direction=np.where(d["amount"] < 0, "debit", "credit"), abs_amount=d["amount"].abs())
+    d = d.sort_values(["merchant", "direction", "date"], kind="stable")
+    keys = [d["merchant"], d["direction"]]
+    d["gap"] = d.groupby(keys, observed=True)["date"].diff().dt.days
+
+    g = d.groupby(["merchant", "direction"], observed=True)
+    agg = g.agg(count=("date", "size"), last=("date", "max"), category=("category", "last"),
+                amount=("abs_amount", "median"), amount_mean=("abs_amount", "mean"),
+                amount_std=("abs_amount", "std"), gap=("gap", "median"),
+                gap_mean=("gap", "mean"), gap_std=("gap", "std"))
+    agg = agg[agg["count"] >= min_occurrences]
+    # regular spacing and a stable amount; several hits a day means a shop, not a bill
+    agg = agg[(agg["gap"] >= 6)
+              & (agg["gap_std"].fillna(0) <= 0.35 * agg["gap_mean"])
+              & (agg["amount_std"].fillna(0) <= 0.25 * agg["amount_mean"])]
+
+    rows = []
+    for (merchant, direction), r in agg.iterrows():
+        cadence = next((c for c in CADENCES if c[1] <= r["gap"] <= c[2]), None)
+        if cadence is None:
+            continue
+        next_date = r["last"] + timedelta(days=float(r["gap"]))
+        rows.append({
+            "merchant": merchant,
+            "direction": direction,
+            "category": r["category"] or None,
+            "cadence": cadence[0],
+            "amount": _r(r["amount"]),
+            "monthly_cost": _r(r["amount"] * 30.44 / cadence[3]),
+            "occurrences": int(r["count"]),
+            "last": r["last"].date().isoformat(),
+            "next_expected": next_date.date().isoformat(),
+            "active": bool(today - r["last"] <= timedelta(days=float(r["gap"]) * 1.5)),
+        })
+    rows.sort(key=lambda r: (not r["active"], r["direction"] != "debit", -r["monthly_cost"]))
+    debits = [r for r in rows if r["active"] and r["direction"] == "debit"]
+    return {
+        "recurring": rows[:limit],
+        "found": len(rows),
+        "active_monthly_cost": _r(sum(r["monthly_cost"] for r in debits)),
+    }
+
+
+def _anomalies(df, days, threshold, limit):
+    spend = df.loc[df["is_spend"], ["id", "date", "spend", "category", "merchant"]]
+    if spend.empty:
+        return {"anomalies": [], "found": 0, "since": None}
+    by_cat = spend.groupby("category", observed=True)["spend"]
+    median = by_cat.transform("median")
+    deviation = (spend["spend"] - median).abs()
+    mad = deviation.groupby(spend["category"], observed=True).transform("median")
+    # categories with mostly identical amounts have MAD 0; fall back to the mean deviation
+    mean_dev = deviation.groupby(spend["category"], observed=True).transform("mean") * 1.2533
+    scale = mad.where(mad > 0, mean_dev)
+    z = (0.6745 * (spend["spend"] - median) / scale.where(scale > 0)).fillna(0.0)
+
+    since = pd.Timestamp(date.today() - timedelta(days=days))
+    hits = spend.assign(z=z, typical=median)
+    hits = hits[(hits["date"] >= since) & (hits["z"] >= threshold)].sort_values("z", ascending=False)
+    return {
+        "since": since.date().isoformat(),
+        "threshold": threshold,
+        "found": len(hits),
+        "anomalies": [{
+            "id": int(r.id),
+            "date": r.date.date().isoformat(),
+            "merchant": r.merchant or None,
+            "category": r.category or None,
+            "amount": _r(r.spend),
+            "typical": _r(r.typical),
+            "score": round(float(r.z), 1),
+        } for r in hits.head(limit).itertuples()],
+    }
+
+
+# --- Public API ---
+
+def monthly_summary(months: int = 12) -> dict:
+    """Spend per month for the last `months` months with a 3-month rolling average."""
+    return _memoized("monthly", _monthly_summary, max(1, min(int(months), 120)))
+
+
+def category_breakdown(month: str = None, months: int = 1, top: int = 10) -> dict:
+    """Spend per category over `months` months ending at `month` (default: this month)."""
+    end = parse_month(month) if month else None
+    return _memoized("categories", _category_breakdown, end, max(1, min(int(months), 120)),
+                     max(1, min(int(top), 50)))
+
+
+def recurring_payments(min_occurrences: int = 3, limit: int = 25) -> dict:
+    """Merchants paid (or paying) on a regular cadence with a stable amount."""
+    return _memoized("recurring", _recurring, max(2, min(int(min_occurrences), 50)), max(1, min(int(limit), 100)))
+
+
+def spending_anomalies(days: int = 90, threshold: float = 3.5, limit: int = 20) -> dict:
+    """Recent transactions far above their category's typical amount (robust z-score)."""
+    return _memoized("anomalies", _anomalies, max(1, min(int(days), 3650)),
+                     round(max(1.0, min(float(threshold), 10.0)), 1), max(1, min(int(limit), 100)))
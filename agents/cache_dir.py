@@ -0,0 +1,170 @@
+import os
+import tempfile
+import time
+import uuid
+
+from agents import metrics
+
+
+# Scratch directory for files the agent writes (saved text, split documents).
+# Every write goes through write-then-rename under a uuid name, and is followed
+# by an eviction pass: entries older than CACHE_TTL_SECONDS go first, then the
+# least recently used until the directory is back under CACHE_MAX_BYTES and
+# CACHE_MAX_ENTRIES. Files that share a name up to the first "." (e.g.
+# <id>.chunks and <id>.idx.json) are one entry and are evicted together.
+
+EVENTS_METRIC = "financebot_scratch_cache_events_total"
+EVENTS = ("writes", "evictions", "bytes_evicted")
+
+
+def cache_dir() -> str:
+    return os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "financebot", "cache"))
+
+
+def _max_bytes() -> int:
+    return int(os.getenv("CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+
+def _max_entries() -> int:
+    return int(os.getenv("CACHE_MAX_ENTRIES", "500"))
+
+
+def _ttl_seconds() -> float:
+    return float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def cache_stats() -> dict:
+    stats = metrics.counts(EVENTS_METRIC, EVENTS)
+    listing = entries()
+    stats.update({"entries": len(listing), "bytes": sum(e["size"] for e in listing)})
+    return stats
+
+
+def atomic_write(path: str, data):
+    """Write `data` (str or bytes) to `path` so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        if isinstance(data, str):
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+        else:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def new_path(prefix: str = "output", suffix: str = ".txt", directory: str = None) -> str:
+    directory = directory or cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+
+
+def write_text(text: str, prefix: str = "output", suffix: str = ".txt") -> str:
+    """Save `text` under a fresh name in the cache directory and return its path."""
+    path = new_path(prefix, suffix)
+    atomic_write(path, text)
+    _incr("writes")
+    evict(keep=path)
+    return path
+
+
+def touch(path: str):
+    """Mark `path` as recently used."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _group(name: str) -> str:
+    return name.split(".", 1)[0]
+
+
+def entries(directory: str = None) -> list:
+    """[{"name", "paths", "size", "mtime"}] for each entry, most recently used first."""
+    directory = directory or cache_dir()
+    groups = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if name.endswith(".tmp"):
+            continue
+        full = os.path.join(directory, name)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            continue
+        if not os.path.isfile(full):
+            continue
+        e = groups.setdefault(_group(name), {"name": name, "paths": [], "size": 0, "mtime": 0.0})
+        e["paths"].append(full)
+        e["size"] += st.st_size
+        e["mtime"] = max(e["mtime"], st.st_mtime)
+    return sorted(groups.values(), key=lambda e: e["mtime"], reverse=True)
+
+
+def _remove_entry(entry):
+    for path in entry["paths"]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    _incr("evictions")
+    _incr("bytes_evicted", entry["size"])
+
+
+def evict(directory: str = None, keep: str = None) -> int:
+    """Apply the TTL and size budgets to `directory`; returns entries removed."""
+    listing = entries(directory)
+    keep_group = _group(os.path.basename(keep)) if keep else None
+    cutoff = time.time() - _ttl_seconds()
+    live, removed = [], 0
+    for e in listing:
+        if e["mtime"] < cutoff and _group(e["name"]) != keep_group:
+            _remove_entry(e)
+            removed += 1
+        else:
+            live.append(e)
+
+    total = sum(e["size"] for e in live)
+    count = len(live)
+    for e in reversed(live):  # least recently used first
+        if total <= _max_bytes() and count <= _max_entries():
+            break
+        if _group(e["name"]) == keep_group:
+            continue
+        _remove_entry(e)
+        total -= e["size"]
+        count -= 1
+        removed += 1
+    return removed
+
+
+def resolve(name_or_path: str) -> str:
+    """Map a file name or path to a path inside the cache directory.
+
+    Raises ValueError for anything that would escape it.
+    """
+    root = os.path.realpath(cache_dir())
+    path = os.path.realpath(os.path.join(root, name_or_path))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"{name_or_path} is not in the cache directory")
+    return path
+
+
+def remove(name_or_path: str) -> str:
+    path = resolve(name_or_path)
+    os.remove(path)
+    return path
@@ -1,14 +1,25 @@
-from langchain.chat_models import init_chat_model
+from langchain_core.messages import RemoveMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
 from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import InjectedStore, tools_condition
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.store.postgres import PostgresStore
+from langgraph.store.postgres.aio import AsyncPostgresStore
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from agents.db import get_async_pool, get_pool
+from agents.metrics import counts, incr, timed
+from agents.tool_executor import ToolExecutor
+from contextlib import nullcontext
+import functools
+import inspect
 import os
+import uuid
 
 
 class State(TypedDict):
@@ -21,64 +32,435 @@ SYSTEM_PROMPT = {
         "If the user asks about transactions, money received, or summaries from account statements, "
         "you should use the tools like `get_data_dir_files_tool`, `pdf_parser_tool`, and `local_llm_tool` "
         "to extract and analyze data from the files. "
+        "To load a bank statement into the database, call `ingest_statement_tool` on the file with a `source` "
+        "naming its account; only convert the lines it reports as unparsed and insert those, in one call and "
+        "with the same `source`, with `insert_large_number_of_transactions`. "
+        "For spending trends, category breakdowns, recurring payments and unusual transactions, call "
+        "`monthly_spending_tool`, `category_spending_tool`, `recurring_payments_tool` or `spending_anomalies_tool` "
+        "before writing SQL; they answer from precomputed data in one call. "
+        "To find transactions at a merchant or by description, use `search_transactions_tool` instead of ILIKE. "
         "If a question does not require file or data access, respond directly."
         "You have to use the tools aggressively to find the relevant information."
     )
 }
 
 
-class ChatbotAgent:
-    def __init__(self, name:str , tools:list):
-        self.name = name
-        self.llm = init_chat_model("google_genai:gemini-2.0-flash", temperature=0)
-        self.llm_with_tools = self.llm.bind_tools(tools)
-        self.tools = tools
+# --- Context budget ---
+# Before every chatbot call the thread plus the system prompt is held to a
+# token budget. Old message bodies over the budget (PDF dumps, SQL results,
+# ...) are moved to the store and replaced in the thread by a short preview
+# with a reference the model can pass to recall_context_tool; so is a recent
+# tool output too big to fit on its own. If many small messages are still over
+# budget, the oldest whole turns are archived and removed, leaving one
+# placeholder that says what they covered and gives the ref of an index of
+# their refs. Recent tool outputs are the last thing stubbed.
+CONTEXT_NAMESPACE = "context_archive"
+STUB_PREVIEW_CHARS = 200
+INDEX_PREVIEW_CHARS = 80
+SUMMARY_QUESTIONS = 5
+
+CONTEXT_METRIC = "financebot_context_events_total"
+CONTEXT_EVENTS = ("trims", "evicted_messages", "removed_messages")
+
+_last_trim = {"last_tokens_before": 0, "last_tokens_after": 0}
+
+
+def context_budget() -> int:
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", "24000"))
+
+
+def context_stats() -> dict:
+    return dict(counts(CONTEXT_METRIC, CONTEXT_EVENTS), **_last_trim,
+                budget=context_budget(), keep_recent=_keep_recent())
+
+
+def _keep_recent() -> int:
+    return int(os.getenv("CONTEXT_KEEP_RECENT", "6"))
+
+
+def _text(m) -> str:
+    return m.content if isinstance(m.content, str) else str(m.content)
+
+
+def context_tokens(messages) -> int:
+    """Approximate tokens the next chatbot call sends, system prompt included."""
+    return count_tokens_approximately(_with_system_prompt(messages))
+
+
+def plan_context_trim(messages, budget:int, keep_recent:int):
+    """Decide how to bring `messages` under `budget` tokens.
+
+    Returns (updates, archived): messages to write back into the thread
+    (stubs with the same id, or RemoveMessage), and {ref: original} to keep
+    in the store. Both are empty when the thread already fits.
+    """
+    before = context_tokens(messages)
+    if before <= budget:
+        return [], {}
+
+    total = before
+    stubs, archived, removed = {}, {}, []
+    cutoff = max(0, len(messages) - keep_recent)
+
+    def archive(m):
+        # already a placeholder from an earlier trim: the original is stored
+        if m.additional_kwargs.get("context_ref"):
+            return m.additional_kwargs["context_ref"]
+        ref = f"{m.type}:{m.id}"
+        archived.setdefault(ref, {"type": m.type, "name": getattr(m, "name", None), "content": _text(m)})
+        return ref
+
+    def stub_bodies(candidates):
+        nonlocal total
+        for m in candidates:
+            if total <= budget:
+                break
+            content = _text(m)
+            if (m.type == "system" or m.id in stubs or m.additional_kwargs.get("context_ref")
+                    or len(content) <= STUB_PREVIEW_CHARS * 2):
+                continue
+            ref = archive(m)
+            stub = m.model_copy(update={
+                "content": (
+                    f"[{len(content)} chars moved out of context, ref={ref}. "
+                    f"Starts: {content[:STUB_PREVIEW_CHARS]!r}. "
+                    f"Call recall_context_tool with this ref to read it in full.]"
+                ),
+                "additional_kwargs": {**m.additional_kwargs, "context_ref": ref},
+            })
+            stubs[m.id] = stub
+            total += count_tokens_approximately([stub]) - count_tokens_approximately([m])
+
+    # 1. replace large old bodies with previews, oldest first, then any recent
+    #    tool output that takes half the budget by itself
+    stub_bodies(messages[:cutoff])
+    recent_tools = [m for m in messages[cutoff:] if m.type == "tool"]
+    stub_bodies(m for m in recent_tools if count_tokens_approximately([m]) > budget // 2)
+
+    # 2. still over: drop whole turns (a user message up to the next one) from
+    #    the front, so tool calls and their results are never split apart
+    turn_starts = [i for i, m in enumerate(messages) if m.type == "human"]
+    dropped = []
+    for start, end in zip(turn_starts, turn_starts[1:]):
+        if total <= budget or end > cutoff:
+            break
+        dropped.append(messages[start:end])
+        for m in messages[start:end]:
+            total -= count_tokens_approximately([stubs.pop(m.id, m)])
+
+    # 3. one placeholder where the dropped turns were (it reuses the first
+    #    message's id to keep its place), so the model knows to recall them
+    if dropped:
+        first = dropped[0][0]
+        index = []
+        for m in (m for turn in dropped for m in turn):
+            preview = " ".join(_text(m).split())[:INDEX_PREVIEW_CHARS]
+            index.append(f"{archive(m)}  {preview}")
+            if m is not first:
+                removed.append(RemoveMessage(id=m.id))
+        index_ref = f"turns:{uuid.uuid4().hex}"
+        archived[index_ref] = {"type": "index", "name": None, "content": "\n".join(index)}
+        questions = [" ".join(_text(t[0]).split())[:INDEX_PREVIEW_CHARS] for t in dropped
+                     if not t[0].additional_kwargs.get("context_ref")]
+        covered = "; ".join(repr(q) for q in questions[:SUMMARY_QUESTIONS])
+        if len(questions) > SUMMARY_QUESTIONS:
+            covered += f" and {len(questions) - SUMMARY_QUESTIONS} more"
+        stub = first.model_copy(update={
+            "content": (
+                f"[{len(index)} earlier messages were moved out of context"
+                + (f"; the questions asked were {covered}" if covered else "")
+                + f". Call recall_context_tool with ref={index_ref} to list their refs.]"
+            ),
+            "additional_kwargs": {**first.additional_kwargs, "context_ref": index_ref},
+        })
+        stubs[first.id] = stub
+        total += count_tokens_approximately([stub])
+
+    # 4. last resort: the remaining recent tool outputs
+    stub_bodies(recent_tools)
+
+    incr(CONTEXT_METRIC, event="trims")
+    incr(CONTEXT_METRIC, len(stubs), event="evicted_messages")
+    incr(CONTEXT_METRIC, len(removed), event="removed_messages")
+    _last_trim.update(last_tokens_before=before, last_tokens_after=total)
+    return list(stubs.values()) + removed, archived
+
+
+def route_context(state: State) -> str:
+    if context_tokens(state["messages"]) > context_budget():
+        return "trim_context"
+    return "chatbot"
+
+
+@tool
+def recall_context_tool(ref: str, config: RunnableConfig, store: Annotated[object, InjectedStore()]) -> str:
+    """Return the full text of an earlier message or tool output that was moved
+    out of the conversation context. `ref` is the value shown in its placeholder.
+    """
+    thread_id = config.get("configurable", {}).get("thread_id", "default_user")
+    item = store.get((CONTEXT_NAMESPACE, thread_id), ref)
+    if item is None:
+        return f"No archived context with ref {ref}."
+    return item.value["content"]
+
+
+NODE_METRIC = "financebot_graph_node_duration_seconds"
+CHECKPOINT_METRIC = "financebot_checkpoint_duration_seconds"
+
+
+class PooledPostgresSaver(PostgresSaver):
+    """PostgresSaver on a connection pool, without the per-instance lock.
+
+    The base class serialises every checkpoint read/write behind one lock
+    because it may be sharing a single connection. Each call here checks out
+    its own pooled connection, so the lock would only make concurrent
+    sessions queue behind each other.
+    """
+
+    def __init__(self, pool):
+        super().__init__(pool)
+        self.lock = nullcontext()
 
-        self.init_bot("default_user")
+    def get_tuple(self, config):
+        with timed(CHECKPOINT_METRIC, op="get_tuple"):
+            return super().get_tuple(config)
 
-        ### dialogue state
-        self.dialogue_state = None
+    def put(self, config, checkpoint, metadata, new_versions):
+        with timed(CHECKPOINT_METRIC, op="put"):
+            return super().put(config, checkpoint, metadata, new_versions)
 
-    def init_bot(self , username:str):
-        self.connect_nodes()
-        self.dialogue_config = { 'configurable': { 'thread_id' : username} }
-        self.dialogue_state = None
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with timed(CHECKPOINT_METRIC, op="put_writes"):
+            return super().put_writes(config, writes, task_id, task_path)
 
-    def connect_nodes(self):
-        self._pg_context = PostgresSaver.from_conn_string(os.getenv("DATABASE_URL"))
-        self._pg_store = PostgresStore.from_conn_string(os.getenv("DATABASE_URL"))
 
-        self.checkpointer = self._pg_context.__enter__()
-        self.store = self._pg_store.__enter__()
+class PooledAsyncPostgresSaver(AsyncPostgresSaver):
+    """Async counterpart of PooledPostgresSaver."""
 
-        self.checkpointer.setup()
-        self.store.setup()
+    def __init__(self, pool):
+        super().__init__(pool)
+        self.lock = nullcontext()
 
+    async def aget_tuple(self, config):
+        with timed(CHECKPOINT_METRIC, op="get_tuple"):
+            return await super().aget_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with timed(CHECKPOINT_METRIC, op="put"):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with timed(CHECKPOINT_METRIC, op="put_writes"):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+
+def _timed_node(name, fn):
+    """Wrap a graph node so its duration is recorded under its node name."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with timed(NODE_METRIC, node=name):
+                return await fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(NODE_METRIC, node=name):
+                return fn(*args, **kwargs)
+    return wrapper
+
+
+def setup_agent_storage():
+    """Create or upgrade the checkpointer and store tables.
+
+    Runs once per deploy from `python -m agents.migrations`, not per worker.
+    """
+    PostgresSaver(get_pool()).setup()
+    PostgresStore(get_pool()).setup()
+
+
+class ChatbotAgent:
+    def __init__(self, name:str , tools:list, llm=None, checkpointer=None, store=None):
+        self.name = name
+        # the process that built this agent; a forked child must build its own
+        self.pid = os.getpid()
+        if llm is None:
+            # imported here: the Gemini client stack is the slowest import in the app
+            from langchain.chat_models import init_chat_model
+            llm = init_chat_model("google_genai:gemini-2.0-flash", temperature=0)
+        self.llm = llm
+        self.tools = tools + [recall_context_tool]
+        self.llm_with_tools = self.llm.bind_tools(self.tools)
+
+        # One compiled graph shared by every session. Conversation state lives
+        # only in the checkpointer, keyed by thread_id, so the agent holds no
+        # per-user state and any worker can serve any session.
+        self.connect_nodes(checkpointer, store)
+
+    def connect_nodes(self, checkpointer=None, store=None):
+        # checkpointer and store share the app's connection pool; their tables
+        # are created by setup_agent_storage() at deploy time
+        if checkpointer is None:
+            checkpointer = PooledPostgresSaver(get_pool())
+        if store is None:
+            store = PostgresStore(get_pool())
+        self.checkpointer = checkpointer
+        self.store = store
+        self.graph = self.build_graph()
+
+    def build_graph(self):
         self.builder = StateGraph(State)
-        self.builder.add_node("chatbot", self.chatbot)
-        self.builder.add_node("tools", ToolNode(tools=self.tools))
-        self.builder.add_edge(START, "chatbot")
+        self.builder.add_node("trim_context", _timed_node("trim_context", self.trim_context))
+        self.builder.add_node("chatbot", _timed_node("chatbot", self.chatbot))
+        self.builder.add_node("tools", ToolExecutor(self.tools))
+        # trim_context only runs (and only costs a checkpoint) when over budget
+        self.builder.add_conditional_edges(START, route_context, ["trim_context", "chatbot"])
+        self.builder.add_edge("trim_context", "chatbot")
         self.builder.add_conditional_edges("chatbot" , tools_condition)
-        self.builder.add_edge("tools", "chatbot")
+        self.builder.add_conditional_edges("tools", route_context, ["trim_context", "chatbot"])
         self.builder.add_edge("chatbot", END)
-        self.graph = self.builder.compile(checkpointer=self.checkpointer , store=self.store)
+        return self.builder.compile(checkpointer=self.checkpointer , store=self.store)
+
 
+    def trim_context(self, state: State, config: RunnableConfig) -> State:
+        updates, archived = plan_context_trim(state["messages"], context_budget(), _keep_recent())
+        namespace = (CONTEXT_NAMESPACE, config["configurable"]["thread_id"])
+        for ref, value in archived.items():
+            self.store.put(namespace, ref, value)
+        return {"messages": updates}
 
     def chatbot(self , state: State) -> State:
-        return {"messages": [self.llm_with_tools.invoke(state["messages"])]}
+        return {"messages": [self.llm_with_tools.invoke(_with_system_prompt(state["messages"]))]}
     
 
-    def dialogue(self, query:str) -> str:
-        user_message = {"role": "user", "content": query}
-        if self.dialogue_state is None:
-            self.dialogue_state = self.graph.invoke(
-                {"messages": [SYSTEM_PROMPT, user_message]},
-                config=self.dialogue_config
-            )
-            return self.dialogue_state["messages"][-1].content
-        else:
-            self.dialogue_state = self.graph.invoke(
-                {"messages": self.dialogue_state["messages"] + [user_message]},
-                config=self.dialogue_config
-            )
-            return self.dialogue_state["messages"][-1].content
+    def dialogue(self, query:str, thread_id:str = "default_user") -> str:
+        # Only the new message goes in; the checkpointer supplies the history.
+        config = { 'configurable': { 'thread_id' : thread_id} }
+        state = self.graph.invoke(
+            {"messages": [{"role": "user", "content": query}]},
+            config=config
+        )
+        return state["messages"][-1].content
+
+
+    def stream_dialogue(self, query:str, thread_id:str = "default_user"):
+        """Yield chat events for one turn as the graph produces them.
+
+        Events are dicts with a "type" of "token" (LLM text as it is generated),
+        "tool_call", "tool_result" or "done" (the final answer).
+        """
+        config = { 'configurable': { 'thread_id' : thread_id} }
+        answer = ""
+        for mode, payload in self.graph.stream(
+            {"messages": [{"role": "user", "content": query}]},
+            config=config,
+            stream_mode=["messages", "updates"],
+        ):
+            for event in _chat_events(mode, payload):
+                if event["type"] == "answer":
+                    answer = event["content"]
+                else:
+                    yield event
+        yield {"type": "done", "answer": answer}
+
+
+class AsyncChatbotAgent(ChatbotAgent):
+    """ChatbotAgent for asyncio servers (see asgi.py).
+
+    Uses ainvoke/astream with the async Postgres checkpointer and store, so a
+    turn that is waiting on the LLM holds no thread. The checkpointer has to
+    be created inside the running event loop, so call `await agent.setup()`
+    once before the first dialogue.
+    """
+
+    def connect_nodes(self, checkpointer=None, store=None):
+        self.checkpointer = checkpointer
+        self.store = store
+        self.graph = self.build_graph() if checkpointer is not None else None
+
+    async def setup(self):
+        if self.graph is None:
+            pool = await get_async_pool()
+            self.checkpointer = PooledAsyncPostgresSaver(pool)
+            self.store = AsyncPostgresStore(pool)
+            self.graph = self.build_graph()
+        return self
+
+    async def trim_context(self, state: State, config: RunnableConfig) -> State:
+        updates, archived = plan_context_trim(state["messages"], context_budget(), _keep_recent())
+        namespace = (CONTEXT_NAMESPACE, config["configurable"]["thread_id"])
+        for ref, value in archived.items():
+            await self.store.aput(namespace, ref, value)
+        return {"messages": updates}
+
+    async def chatbot(self , state: State) -> State:
+        return {"messages": [await self.llm_with_tools.ainvoke(_with_system_prompt(state["messages"]))]}
+
+    async def adialogue(self, query:str, thread_id:str = "default_user") -> str:
+        config = { 'configurable': { 'thread_id' : thread_id} }
+        state = await self.graph.ainvoke(
+            {"messages": [{"role": "user", "content": query}]},
+            config=config
+        )
+        return state["messages"][-1].content
+
+    async def astream_dialogue(self, query:str, thread_id:str = "default_user"):
+        """Async version of stream_dialogue."""
+        config = { 'configurable': { 'thread_id' : thread_id} }
+        answer = ""
+        async for mode, payload in self.graph.astream(
+            {"messages": [{"role": "user", "content": query}]},
+            config=config,
+            stream_mode=["messages", "updates"],
+        ):
+            for event in _chat_events(mode, payload):
+                if event["type"] == "answer":
+                    answer = event["content"]
+                else:
+                    yield event
+        yield {"type": "done", "answer": answer}
+
+
+def _with_system_prompt(messages):
+    # The system prompt is added per call rather than stored in the thread,
+    # so checkpoints only carry the conversation itself. Threads created
+    # before this still start with their stored copy.
+    if messages and getattr(messages[0], "type", None) == "system":
+        return messages
+    return [SYSTEM_PROMPT] + messages
+
+
+def _chat_events(mode, payload):
+    """Turn one graph.stream item into chat events.
+
+    A final (tool-free) assistant message is reported as an internal
+    "answer" event that the caller folds into "done".
+    """
+    if mode == "messages":
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") == "chatbot":
+            text = _text_content(chunk)
+            if text:
+                yield {"type": "token", "content": text}
+        return
+    for node, update in payload.items():
+        for message in (update or {}).get("messages", []):
+            if node == "chatbot":
+                tool_calls = getattr(message, "tool_calls", None) or []
+                for call in tool_calls:
+                    yield {"type": "tool_call", "name": call["name"], "args": call["args"]}
+                if not tool_calls:
+                    yield {"type": "answer", "content": _text_content(message)}
+            elif node == "tools":
+                yield {
+                    "type": "tool_result",
+                    "name": getattr(message, "name", None),
+                    "content": _text_content(message)[:200],
+                }
+
+
+def _text_content(message) -> str:
+    # Gemini may return content as a list of parts instead of a plain string
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import mmap
+import os
+
+from agents import cache_dir
+
+
+# Chunks of one source document live in a single file, <doc_id>.chunks, with
+# a small JSON index of (byte offset, byte length) per chunk next to it.
+# Reading chunk i of a document is one mmap slice; no per-chunk files are
+# created, listed or reopened. doc_id is derived from the text itself, so
+# splitting the same document twice reuses the stored chunks. The directory is
+# kept to the cache_dir budgets, whole documents evicted least recently used.
+
+
+def store_dir() -> str:
+    return os.getenv("CHUNK_STORE_DIR", os.path.join(cache_dir.cache_dir(), "chunks"))
+
+
+def _paths(doc_id: str):
+    if not doc_id.isalnum():
+        raise ValueError(f"invalid doc_id {doc_id!r}")
+    base = os.path.join(store_dir(), doc_id)
+    return base + ".chunks", base + ".idx.json"
+
+
+def doc_id_for(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def put_document(text: str, chunks: list, source: str = None) -> str:
+    """Store `chunks` (split from `text`) and return the document id."""
+    doc_id = doc_id_for(text)
+    data_path, index_path = _paths(doc_id)
+    if os.path.exists(index_path) and os.path.exists(data_path):
+        cache_dir.touch(index_path)
+        return doc_id
+
+    os.makedirs(store_dir(), exist_ok=True)
+    offsets, parts, pos = [], [], 0
+    for chunk in chunks:
+        encoded = chunk.encode("utf-8")
+        offsets.append([pos, len(encoded)])
+        parts.append(encoded)
+        pos += len(encoded)
+
+    # data first, index last: an index on disk means the document is complete
+    cache_dir.atomic_write(data_path, b"".join(parts))
+    cache_dir.atomic_write(index_path, json.dumps({"source": source, "offsets": offsets}))
+    cache_dir.evict(store_dir(), keep=index_path)
+    return doc_id
+
+
+def read_index(doc_id: str) -> dict:
+    _, index_path = _paths(doc_id)
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chunk_count(doc_id: str) -> int:
+    return len(read_index(doc_id)["offsets"])
+
+
+def get_chunks(doc_id: str, start: int = 0, end: int = None) -> list:
+    """Return chunks [start, end) of a stored document."""
+    offsets = read_index(doc_id)["offsets"][start:end]
+    if not offsets:
+        return []
+    data_path, index_path = _paths(doc_id)
+    cache_dir.touch(index_path)
+    with open(data_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ["" for _ in offsets]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [mm[o:o + n].decode("utf-8") for o, n in offsets]
+
+
+def list_documents() -> list:
+    """[(doc_id, source, n_chunks)] for every stored document."""
+    docs = []
+    directory = store_dir()
+    if not os.path.isdir(directory):
+        return docs
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".idx.json"):
+            doc_id = name[: -len(".idx.json")]
+            index = read_index(doc_id)
+            docs.append((doc_id, index.get("source"), len(index["offsets"])))
+    return docs
+
+
+def delete_document(doc_id: str):
+    for path in _paths(doc_id)[::-1]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
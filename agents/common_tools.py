@@ -1,7 +1,13 @@
 from langchain_core.tools import tool
 from datetime import datetime
-import os, requests, pdfplumber
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os, requests
+from agents.pdf_extract import extract_pdf_pages
+from agents import cache_dir, chunk_store
+from agents.memo import memoize
+
+# (connect, read) seconds; under google_search_tool's 20s in tool_executor.TOOL_LIMITS,
+# since a call that outlives that keeps its worker thread until requests gives up
+SEARCH_TIMEOUT = (5, 10)
 
 @tool
 def date_tool() -> str:
@@ -9,6 +15,7 @@ def date_tool() -> str:
     return datetime.today().strftime("%Y-%m-%d")
 
 @tool
+@memoize()
 def calculator_tool(expression: str) -> str:
     """Evaluate a basic mathematical expression."""
     try:
@@ -18,6 +25,7 @@ def calculator_tool(expression: str) -> str:
         return f"Error: {e}"
 
 @tool
+@memoize(ttl=600)
 def google_search_tool(query: str) -> str:
     """Search Google and return top 3 results with title and snippet."""
     url = "https://www.googleapis.com/customsearch/v1"
@@ -28,7 +36,7 @@ def google_search_tool(query: str) -> str:
         "num": 3
     }
     try:
-        data = requests.get(url, params=params).json()
+        data = requests.get(url, params=params, timeout=SEARCH_TIMEOUT).json()
         items = data.get("items", [])
         if not items:
             return "No results found."
@@ -39,6 +47,7 @@ def google_search_tool(query: str) -> str:
         return f"Error: {e}"
 
 @tool
+@memoize(file_args=("file_path",), max_chars=2_000_000)
 def text_parser_tool(file_path: str) -> str:
     """Extract text content from a PDF or txt at the given path."""
     if str(file_path).lower().endswith('.txt'):
@@ -49,8 +58,7 @@ def text_parser_tool(file_path: str) -> str:
             return f"Error reading text file: {e}"
     elif str(file_path).lower().endswith('.pdf'):
         try:
-            with pdfplumber.open(file_path) as pdf:
-                pages = [p.extract_text() for p in pdf.pages if p.extract_text()]
+            pages = [p for p in extract_pdf_pages(file_path) if p]
             return "\n".join(pages) or "No text found."
         except Exception as e:
             return f"Error reading PDF: {e}"
@@ -60,6 +68,7 @@ def text_parser_tool(file_path: str) -> str:
 
 
 @tool
+@memoize(ttl=30)
 def get_data_dir_files_tool() -> str:
     """List all file paths in the data directory."""
     data_dir = r"C:\Users\sachi\OneDrive\Desktop\PersonalFinanceManager\data"
@@ -69,20 +78,31 @@ def get_data_dir_files_tool() -> str:
         return f"Error: {e}"
     
 @tool
-def get_cache_dir_files_tool() -> str:
-    """List all file paths in the cache directory."""
-    cache_dir = r"C:\Users\sachi\OneDrive\Desktop\PersonalFinanceManager\cache"
+def get_cache_dir_files_tool(page: int = 1, page_size: int = 20) -> str:
+    """List files in the cache directory, most recently used first, one page at a time.
+    The first line is the directory; each other line is a file name, size in KB and age.
+    """
     try:
-        return "\n".join(os.path.join(cache_dir, f) for f in os.listdir(cache_dir))
+        listing = cache_dir.entries()
+        page_size = max(1, min(page_size, 50))
+        pages = max(1, -(-len(listing) // page_size))
+        page = max(1, min(page, pages))
+        now = datetime.now().timestamp()
+        lines = [f"{cache_dir.cache_dir()} - {len(listing)} file(s), page {page}/{pages}"]
+        for e in listing[(page - 1) * page_size:page * page_size]:
+            age = int(now - e["mtime"])
+            age = f"{age // 3600}h" if age >= 3600 else f"{age // 60}m"
+            lines.append(f"{e['name']}  {e['size'] / 1024:.1f}KB  {age}")
+        return "\n".join(lines)
     except Exception as e:
         return f"Error: {e}"
     
 @tool
 def remove_file_tool(file_path: str) -> str:
-    """Remove the file at the given path."""
+    """Remove a file from the cache directory, by name or path."""
     try:
-        os.remove(file_path)
-        return f"File {file_path} removed."
+        path = cache_dir.remove(file_path)
+        return f"File {path} removed."
     except Exception as e:
         return f"Error removing file: {e}"
 
@@ -102,40 +122,49 @@ def local_llm_tool(prompt: str) -> str:
 @tool
 def save_text_to_txt_tool(text: str) -> str:
     """Save the provided text to a .txt file and return the path of file written."""
-    cache_dir = r"C:\Users\sachi\OneDrive\Desktop\PersonalFinanceManager\cache"
-    random_filename = f"output_{int(datetime.now().timestamp())}.txt"
-    file_path = os.path.join(cache_dir, random_filename)
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(text)
+        file_path = cache_dir.write_text(text)
         return f"Text saved to {file_path}"
     except Exception as e:
         return f"Error saving text: {e}"
     
 @tool
 def split_txt_into_chunks_txts_tool(file_path: str) -> str:
-    """Split a .txt file into chunks and save each chunk as a separate .txt file. Return paths of files written.
-    Use it for large .txt files so that LLM can process them in parts. Each chunk is 1000 characters with 100 character overlap. 
+    """Split a .txt file into chunks so that LLM can process them in parts. Returns a doc_id
+    and the number of chunks; read them with read_chunks_tool. Each chunk is up to 400
+    characters with 100 character overlap.
     """
-    cache_dir = r"C:\Users\sachi\OneDrive\Desktop\PersonalFinanceManager\cache"
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             text = f.read()
         
+        # imported on first use: langchain's splitter package takes ~0.7s to import
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=100)
         chunks = text_splitter.split_text(text)
-        
-        file_paths = []
-        for i, chunk in enumerate(chunks):
-            chunk_filename = f"chunk_{i+1}_{int(datetime.now().timestamp())}.txt"
-            chunk_path = os.path.join(cache_dir, chunk_filename)
-            with open(chunk_path, "w", encoding="utf-8") as cf:
-                cf.write(chunk)
-            file_paths.append(chunk_path)
-        
-        return "\n".join(file_paths) if file_paths else "No chunks created."
+        if not chunks:
+            return "No chunks created."
+
+        doc_id = chunk_store.put_document(text, chunks, source=file_path)
+        return f"doc_id={doc_id} chunks={len(chunks)} (read with read_chunks_tool, indices 0..{len(chunks) - 1})"
     except Exception as e:
         return f"Error splitting text: {e}"
+
+@tool
+def read_chunks_tool(doc_id: str, start: int = 0, end: int = 5) -> str:
+    """Read chunks [start, end) of a document split by split_txt_into_chunks_txts_tool.
+    At most 20 chunks are returned per call.
+    """
+    try:
+        end = min(end, start + 20)
+        chunks = chunk_store.get_chunks(doc_id, start, end)
+        if not chunks:
+            return f"No chunks in range {start}..{end} for {doc_id}."
+        return "\n\n".join(f"[chunk {start + i}]\n{c}" for i, c in enumerate(chunks))
+    except FileNotFoundError:
+        return f"Unknown doc_id {doc_id}."
+    except Exception as e:
+        return f"Error reading chunks: {e}"
     
 
 
@@ -151,5 +180,6 @@ tools = [date_tool,
          save_text_to_txt_tool , 
          get_cache_dir_files_tool,
          remove_file_tool,
-         split_txt_into_chunks_txts_tool
+         split_txt_into_chunks_txts_tool,
+         read_chunks_tool
          ]
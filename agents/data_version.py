@@ -0,0 +1,27 @@
+from agents.db import connection
+
+
+# A single counter in the database that moves whenever financial data changes.
+# Statement triggers on `transactions` bump it (migration 5), so every worker
+# sees the same version; other writes can bump it explicitly. Caches key their
+# entries on it instead of trying to track which rows changed.
+
+
+def current_data_version(conn=None):
+    """Return (version, updated_at) of the financial data."""
+    if conn is None:
+        with connection() as conn:
+            return current_data_version(conn)
+    row = conn.execute("SELECT version, updated_at FROM data_version WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def bump_data_version(conn=None):
+    """Mark the data as changed, for writes that don't go through `transactions`."""
+    if conn is None:
+        with connection() as conn:
+            return bump_data_version(conn)
+    row = conn.execute(
+        "UPDATE data_version SET version = version + 1, updated_at = now() WHERE id = 1 RETURNING version"
+    ).fetchone()
+    return row[0] if row else 0
@@ -1,72 +1,248 @@
 import json
+import os
+import re
+import threading
+from cachetools import TTLCache
 from langchain_core.tools import tool
-import psycopg2, os
-from psycopg2 import OperationalError, InterfaceError, DatabaseError
+from psycopg import OperationalError, InterfaceError, DatabaseError
+from psycopg.errors import QueryCanceled
+from agents import metrics
+from agents.data_version import current_data_version
+from agents.db import connection
+from agents.query_engine import is_read_query, run_query, statement_timeout_ms
+from agents.ingest import copy_transactions
+from agents.search import search_transactions
+from agents.statement_parser import ingest_statement
 
 
 
+# --- SQL result cache ---
+# Reads from run_sql_query_tool are cached by (normalized SQL, params, data
+# version). Normalizing folds case and whitespace outside quoted literals and
+# identifiers, so a reformatted SELECT hits the same entry. Any write to
+# `transactions` (SQL tool, COPY ingestion, statement ingestion) moves the data
+# version, which makes every older entry unreachable; TTL and LRU clean up.
+# Only the tables the version tracks are cached: a query that names any other
+# relation (forecasts, users, checkpoints, the store, the catalogs) always
+# runs. The version is read on the connection that then runs the query, and
+# before it, so an entry is never older than its key.
+_sql_cache = TTLCache(maxsize=int(os.getenv("SQL_CACHE_SIZE", "256")),
+                      ttl=float(os.getenv("SQL_CACHE_TTL_SECONDS", "300")))
+_sql_cache_lock = threading.Lock()
+SQL_CACHE_METRIC = "financebot_sql_cache_events_total"
+SQL_CACHE_EVENTS = ("hits", "misses", "uncacheable")
+
+_SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\$\$.*?\$\$)|(\s+)|([^'"\s$]+|\$)""", re.DOTALL)
+_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_$]*")
+CACHED_TABLES = {"transactions", "expense_rollup"}
+_other_relations = None
+_VOLATILE = re.compile(r"\b(random|now|clock_timestamp|statement_timestamp|timeofday|nextval|"
+                       r"current_date|current_time|current_timestamp|localtime|localtimestamp)\b", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    parts = []
+    for quoted, space, word in _SQL_TOKENS.findall(query.strip().rstrip(";").strip()):
+        if quoted:
+            parts.append(quoted)
+        elif space:
+            parts.append(" ")
+        else:
+            parts.append(word.lower())
+    return "".join(parts)
+
+
+def _relation_words(query: str) -> set:
+    """Identifiers in `query` outside string literals, quoted ones unquoted."""
+    words = set()
+    for quoted, _, word in _SQL_TOKENS.findall(query):
+        if quoted.startswith('"'):
+            words.add(quoted[1:-1].replace('""', '"').lower())
+        elif word:
+            words.update(_IDENTIFIER.findall(word.lower()))
+    return words
+
+
+def _cacheable(conn, query: str) -> bool:
+    global _other_relations
+    if not is_read_query(query) or _VOLATILE.search(query):
+        return False
+    words = _relation_words(query)
+    if not words & CACHED_TABLES:
+        return False
+    if _other_relations is None:
+        rows = conn.execute("""
+            SELECT DISTINCT relname FROM pg_class
+            WHERE relkind IN ('r', 'v', 'm', 'p', 'f')
+              AND relnamespace NOT IN ('pg_catalog'::regnamespace, 'information_schema'::regnamespace)
+        """).fetchall()
+        _other_relations = {r[0] for r in rows} - CACHED_TABLES
+    return not (words & _other_relations
+                or any(w.startswith("pg_") or w == "information_schema" for w in words))
+
+
+def sql_cache_stats() -> dict:
+    with _sql_cache_lock:
+        size = len(_sql_cache)
+    return dict(metrics.counts(SQL_CACHE_METRIC, SQL_CACHE_EVENTS), size=size)
+
+
+def _cached_query(query, params):
+    with connection() as conn:
+        if not _cacheable(conn, query):
+            metrics.incr(SQL_CACHE_METRIC, event="uncacheable")
+            return run_query(query, params, conn)
+
+        version, _ = current_data_version(conn)
+        key = (normalize_sql(query), json.dumps(params, sort_keys=True, default=str), version)
+        with _sql_cache_lock:
+            result = _sql_cache.get(key)
+        metrics.incr(SQL_CACHE_METRIC, event="hits" if result is not None else "misses")
+        if result is None:
+            result = run_query(query, params, conn)
+            with _sql_cache_lock:
+                _sql_cache[key] = result
+        return result
+
+
 @tool
 def run_sql_query_tool(query: str, params=None):
-    """Execute a SQL query on the PostgreSQL database and return results."""
+    """Execute a SQL query on the PostgreSQL database and return results.
+    Large results are returned as a row count, column stats and a sample rather than
+    every row, so prefer aggregates (SUM, COUNT, GROUP BY) and LIMIT.
+    """
     try:
-        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
-        cur = conn.cursor()
-        cur.execute(query, params)
-
-        # Only fetch results if it's a SELECT
-        if query.strip().lower().startswith("select"):
-            
-            results = cur.fetchall()
-        else:
-            results = None
-            conn.commit()
+        return _cached_query(query, params)
+
+    except QueryCanceled:
+        return f"Query cancelled: it ran longer than {statement_timeout_ms()} ms. Narrow it down or aggregate."
+    except (OperationalError, InterfaceError, DatabaseError) as e:
+        print(f"Database error: {e}")
+        return f"Database error: {e}"
 
-        return results
+@tool
+def insert_large_number_of_transactions(json_data, source: str = None):
+    """Insert a large number of transactions into the database.
+    json_data: List of transaction dicts with keys 'amount', 'category', 'date', 'description'.
+    source: the account the rows come from (e.g. "hdfc-1234"); use the same value as the
+    statement they belong to.
+    Transactions that are already in the database are skipped, so re-sending rows is safe.
+    Identical rows (same date, amount and description) are only kept apart within one call,
+    so send all of an account's rows in a single call.
+    Returns how many rows were inserted, skipped and rejected, and the first skipped rows;
+    if one of those is really another identical transaction, insert it with run_sql_query_tool.
+    """
+    try:
+        result = copy_transactions(json_data, source=source)
+        print(f"Inserted {result['inserted']} transactions, skipped {result['skipped']} "
+              f"({result['rows_per_sec']} rows/sec)")
+        return result
 
     except (OperationalError, InterfaceError, DatabaseError) as e:
         print(f"Database error: {e}")
-        return None
+        return f"Database error: {e}"
+
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 @tool
-def insert_large_number_of_transactions(json_data, batch_size=100):
-    """Insert a large number of transactions into the database in batches.
-    json_data: List of transaction dicts with keys 'amount', 'category', 'date', 'description'.
+def ingest_statement_tool(file_path: str, source: str = None):
+    """Load a bank statement (.pdf, .txt or .csv) into the transactions table without
+    reading it yourself. source: the account the statement belongs to (e.g. "hdfc-1234");
+    ask the user if it isn't clear, since the same charge on two accounts is only kept
+    twice when their sources differ. Returns counts plus any lines that could not be parsed;
+    only those lines need to be converted and passed to insert_large_number_of_transactions
+    with the same source.
+    Loading a statement again skips the transactions that are already in the database;
+    skipped_rows lists the first of them.
     """
     try:
-        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
-        cur = conn.cursor()
-        
-        for i in range(0, len(json_data), batch_size):
-            batch = json_data[i:i+batch_size]
-            args_str = ','.join(cur.mogrify("(%s, %s, %s, %s)", 
-                        (t['amount'], t['category'], t['date'], t['description'])).decode('utf-8') for t in batch)
-            cur.execute("INSERT INTO transactions (amount, category, date, description) VALUES " + args_str)
-        
-        conn.commit()
-        print("Large data inserted successfully!")
-    
+        result = ingest_statement(file_path, source=source)
+        print(f"Ingested {result['inserted']} transactions from {file_path}, {result['skipped']} already loaded, "
+              f"{result['unparsed_count']} unparsed")
+        return result
+
     except (OperationalError, InterfaceError, DatabaseError) as e:
         print(f"Database error: {e}")
-    
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        return f"Database error: {e}"
+    except Exception as e:
+        return f"Error ingesting statement: {e}"
 
 
 
-sql_tools = [
-    run_sql_query_tool,
-    insert_large_number_of_transactions
-]
+@tool
+def search_transactions_tool(query: str, page: int = 1):
+    """Find transactions by merchant or description words ("amazon", "swiggy", "netflix"),
+    tolerating partial words and typos. Returns the matching merchants with counts and
+    totals, the overall total, and one page of 20 transactions (newest first).
+    Use this instead of ILIKE queries; pass `page` for more.
+    """
+    try:
+        return search_transactions(query, page)
+
+    except ValueError as e:
+        return f"Error: {e}"
+    except (OperationalError, InterfaceError, DatabaseError) as e:
+        print(f"Database error: {e}")
+        return f"Database error: {e}"
+
+
+
+# --- Analytics tools ---
+# Precomputed answers from agents/analytics.py; pandas is imported on first use.
+
+def _analytics(name, *args):
+    from agents import analytics
+    try:
+        return getattr(analytics, name)(*args)
+    except ValueError as e:
+        return f"Error: {e}"
+    except (OperationalError, InterfaceError, DatabaseError) as e:
+        print(f"Database error: {e}")
+        return f"Database error: {e}"
+
+
+@tool
+def monthly_spending_tool(months: int = 12):
+    """Total spend per month for the last `months` months, with transaction counts,
+    a 3-month rolling average and month-over-month change. Transfers and money
+    received are excluded. Use this instead of SQL for spending trends.
+    """
+    return _analytics("monthly_summary", months)
+
+
+@tool
+def category_spending_tool(month: str = "", months: int = 1):
+    """Spend per category (total, count, average transaction, share, change against
+    the previous 3 months) over `months` months ending at `month` ("YYYY-MM";
+    empty for the current month).
+    """
+    return _analytics("category_breakdown", month or None, months)
 
 
+@tool
+def recurring_payments_tool():
+    """Subscriptions, bills, rent and salary: merchants that recur on a regular cadence
+    with a stable amount, with the next expected date and the monthly cost.
+    """
+    return _analytics("recurring_payments")
 
 
+@tool
+def spending_anomalies_tool(days: int = 90):
+    """Transactions in the last `days` days that are unusually large for their category,
+    scored against the category's typical amount. Each has an id for follow-up SQL.
+    """
+    return _analytics("spending_anomalies", days)
+
+
+
+sql_tools = [
+    run_sql_query_tool,
+    insert_large_number_of_transactions,
+    ingest_statement_tool,
+    search_transactions_tool,
+    monthly_spending_tool,
+    category_spending_tool,
+    recurring_payments_tool,
+    spending_anomalies_tool,
+]
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from agents import metrics
+
+
+# One pool per process, shared by the Flask routes, the SQL tools and the
+# LangGraph checkpointer/store. Connections are autocommit because that is
+# what PostgresSaver/PostgresStore expect; callers that need a multi-statement
+# transaction wrap their work in `conn.transaction()`.
+_pool = None
+_pool_lock = threading.Lock()
+
+# monotonic timestamp of when each connection was last handed back to the pool
+_last_used = weakref.WeakKeyDictionary()
+
+EVENTS_METRIC = "financebot_db_pool_events_total"
+EVENTS = ("checkouts", "health_checks", "health_check_failures")
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def _idle_check_seconds():
+    return float(os.getenv("DB_POOL_IDLE_CHECK_SECONDS", "30"))
+
+
+def _configure(conn):
+    _last_used[conn] = time.monotonic()
+
+
+def _reset(conn):
+    _last_used[conn] = time.monotonic()
+
+
+def _pool_kwargs():
+    return dict(
+        min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "600")),
+        kwargs={"autocommit": True},
+    )
+
+
+def _check(conn):
+    # Only ping connections that sat idle long enough to have been dropped
+    # by the server or a proxy; recently used ones are handed out directly.
+    idle = time.monotonic() - _last_used.get(conn, 0.0)
+    if idle < _idle_check_seconds():
+        return
+    _incr("health_checks")
+    try:
+        conn.execute("SELECT 1")
+    except Exception:
+        _incr("health_check_failures")
+        raise
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.getenv("DATABASE_URL"),
+                    **_pool_kwargs(),
+                    configure=_configure,
+                    reset=_reset,
+                    check=_check,
+                    name="finance",
+                    open=True,
+                )
+    return _pool
+
+
+@contextmanager
+def connection():
+    """Check a connection out of the pool for the duration of the block."""
+    with get_pool().connection() as conn:
+        _incr("checkouts")
+        yield conn
+
+
+# The async pool serves the ASGI app (see asgi.py). It belongs to the event
+# loop that opened it, so it is created and opened from inside that loop.
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+
+async def _acheck(conn):
+    idle = time.monotonic() - _last_used.get(conn, 0.0)
+    if idle < _idle_check_seconds():
+        return
+    _incr("health_checks")
+    try:
+        await conn.execute("SELECT 1")
+    except Exception:
+        _incr("health_check_failures")
+        raise
+
+
+async def _aconfigure(conn):
+    _last_used[conn] = time.monotonic()
+
+
+async def _areset(conn):
+    _last_used[conn] = time.monotonic()
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """Return the process-wide async pool, opening it on first use."""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    os.getenv("DATABASE_URL"),
+                    **_pool_kwargs(),
+                    configure=_aconfigure,
+                    reset=_areset,
+                    check=_acheck,
+                    name="finance-async",
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+
+@asynccontextmanager
+async def async_connection():
+    """Async counterpart of connection()."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        _incr("checkouts")
+        yield conn
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _forget_pools_after_fork():
+    # A pool inherited through fork holds the parent's sockets and worker
+    # threads that didn't survive the fork. Closing it here would terminate
+    # the parent's sessions, so the child only drops its references and opens
+    # its own pool on first use.
+    global _pool, _pool_lock, _async_pool, _async_pool_lock
+    _pool = None
+    _async_pool = None
+    _pool_lock = threading.Lock()
+    _async_pool_lock = asyncio.Lock()
+    _last_used.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pools_after_fork)
+
+
+def _saturation(pool, stats):
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    stats["in_use"] = in_use
+    stats["saturation"] = round(in_use / pool.max_size, 3) if pool.max_size else 0.0
+    return stats
+
+
+def pool_stats() -> dict:
+    """Pool size, availability and wait counters, plus checkout/health-check totals."""
+    stats = metrics.counts(EVENTS_METRIC, EVENTS)
+    stats["open"] = _pool is not None
+    if _pool is not None:
+        stats.update(_saturation(_pool, _pool.get_stats()))
+    if _async_pool is not None:
+        stats["async"] = _saturation(_async_pool, _async_pool.get_stats())
+    return stats
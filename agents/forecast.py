@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from agents import metrics
+from agents.db import connection
+
+
+# Monthly spending forecasts (total and the top categories) fitted with
+# Prophet, which takes a few hundred ms per series and so never runs inside a
+# request. A background thread in each web worker wakes every
+# FORECAST_CHECK_SECONDS and refits only when the transaction count has moved
+# by FORECAST_REFIT_MIN_ROWS or another month has completed since the last
+# fit; an advisory lock makes one worker do it while the others skip. Fitted
+# parameters (model_to_json), the training history and the forecast are
+# stored in spending_forecasts (migration 7), so /forecast-data is a single
+# small read. `python -m agents.forecast refit` fits from the command line.
+# Series come from the analytics frame (agents/analytics.py), so they use the
+# same definition of spend as the dashboard. The current month is partial and
+# is never trained on.
+
+# arbitrary key so two workers don't fit at once
+_LOCK_KEY = 72_410_005
+
+EVENTS_METRIC = "financebot_forecast_events_total"
+EVENTS = ("checks", "refits", "skipped", "busy", "errors", "series_fitted")
+
+_last = {"last_refit_seconds": 0.0, "last_error": None}
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def _horizon() -> int:
+    return int(os.getenv("FORECAST_HORIZON_MONTHS", "3"))
+
+
+def _min_months() -> int:
+    return int(os.getenv("FORECAST_MIN_MONTHS", "6"))
+
+
+def _max_categories() -> int:
+    return int(os.getenv("FORECAST_MAX_CATEGORIES", "8"))
+
+
+def _refit_min_rows() -> int:
+    return int(os.getenv("FORECAST_REFIT_MIN_ROWS", "200"))
+
+
+def _check_seconds() -> float:
+    return float(os.getenv("FORECAST_CHECK_SECONDS", "300"))
+
+
+def _uncertainty_samples() -> int:
+    return int(os.getenv("FORECAST_UNCERTAINTY_SAMPLES", "300"))
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv("FORECAST_SCHEDULER", "1") == "1"
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def forecast_stats() -> dict:
+    return dict(metrics.counts(EVENTS_METRIC, EVENTS), **_last, scheduler_running=_scheduler_pid == os.getpid())
+
+
+def _month_start(m: int) -> date:
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def last_complete_month() -> int:
+    today = date.today()
+    return today.year * 12 + today.month - 2
+
+
+# --- Series and fitting ---
+
+def monthly_series(df: pd.DataFrame, through: int, max_categories: int = None) -> dict:
+    """{(kind, name): spend per month, indexed by month number} for complete months."""
+    spend = df.loc[df["is_spend"] & (df["month"] <= through), ["date", "month", "category", "spend"]]
+    if spend.empty:
+        return {}
+    # the first month is partial unless the history starts on the 1st; it would read as a dip
+    first = spend["date"].min()
+    start = int(spend["month"].min()) + (first.day > 1)
+    spend = spend[spend["month"] >= start]
+    if spend.empty:
+        return {}
+    total = spend.groupby("month")["spend"].sum()
+    series = {("total", ""): total.reindex(range(start, through + 1), fill_value=0.0)}
+
+    recent = spend[spend["month"] > through - 12]
+    top = recent.groupby("category", observed=True)["spend"].sum().nlargest(
+        _max_categories() if max_categories is None else max_categories)
+    by_cat = spend[spend["category"].isin(top.index)].groupby(["category", "month"], observed=True)["spend"].sum()
+    for category in top.index:
+        s = by_cat.loc[category]
+        series[("category", category)] = s.reindex(range(int(s.index.min()), through + 1), fill_value=0.0)
+    return series
+
+
+def fit_series(values: pd.Series, horizon: int = None) -> dict:
+    """Fit one monthly series; returns the forecast rows and the serialized model."""
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+    from cmdstanpy.utils import get_logger
+    get_logger().setLevel(logging.WARNING)  # one INFO line per Stan run otherwise
+
+    horizon = _horizon() if horizon is None else horizon
+    history = pd.DataFrame({"ds": [pd.Timestamp(_month_start(int(m))) for m in values.index],
+                            "y": values.to_numpy(dtype=float)})
+    start = time.perf_counter()
+    # a low-order yearly term once there are two years: the default order (10) has
+    # nearly as many parameters as points and sends the optimizer into slow retries
+    model = Prophet(yearly_seasonality=3 if len(history) >= 24 else False, weekly_seasonality=False,
+                    daily_seasonality=False, interval_width=0.8,
+                    uncertainty_samples=_uncertainty_samples())
+    model.fit(history)
+    future = model.make_future_dataframe(periods=horizon, freq="MS", include_history=False)
+    predicted = model.predict(future)
+    return {
+        "history": [[_month_start(int(m)).isoformat(), round(float(v), 2)] for m, v in values.items()],
+        # spend can't go below zero, whatever the trend line says
+        "forecast": [[row.ds.date().isoformat(), round(max(row.yhat, 0.0), 2),
+                      round(max(row.yhat_lower, 0.0), 2), round(max(row.yhat_upper, 0.0), 2)]
+                     for row in predicted.itertuples()],
+        "params": json.loads(model_to_json(model)),
+        "fit_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+# --- Refit ---
+
+def _fit_state(conn):
+    """(rows_at_fit, trained_through month number) of the stored total forecast, or None."""
+    row = conn.execute(
+        "SELECT rows_at_fit, trained_through FROM spending_forecasts WHERE kind = 'total'"
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1].year * 12 + row[1].month - 1
+
+
+def _needs_refit(state, rows: int, through: int) -> bool:
+    if state is None:
+        return True
+    rows_at_fit, trained_through = state
+    return trained_through != through or abs(rows - rows_at_fit) >= _refit_min_rows()
+
+
+def refit(force: bool = False) -> dict:
+    """Refit every series if the data moved enough (or `force`), and store the results.
+
+    Returns {"status": "refit" | "skipped" | "busy" | "no_data", ...}.
+    """
+    from agents import analytics
+
+    _incr("checks")
+    frame = analytics.snapshot().frame
+    rows, through = len(frame), last_complete_month()
+    with connection() as conn:
+        if not force and not _needs_refit(_fit_state(conn), rows, through):
+            _incr("skipped")
+            return {"status": "skipped", "rows": rows}
+
+        # a session lock rather than a transaction one: the fit takes seconds and
+        # must not keep a connection idle in transaction; only the write below is one
+        if not conn.execute("SELECT pg_try_advisory_lock(%s)", (_LOCK_KEY,)).fetchone()[0]:
+            _incr("busy")
+            return {"status": "busy"}
+        try:
+            if not force and not _needs_refit(_fit_state(conn), rows, through):
+                _incr("skipped")
+                return {"status": "skipped", "rows": rows}
+
+            series = {k: v for k, v in monthly_series(frame, through).items() if len(v) >= _min_months()}
+            if not series:
+                _incr("skipped")
+                return {"status": "no_data", "rows": rows}
+
+            start = time.perf_counter()
+            fitted = {key: fit_series(values) for key, values in series.items()}
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute("DELETE FROM spending_forecasts")
+                cur.executemany(
+                    """INSERT INTO spending_forecasts (kind, name, trained_through, rows_at_fit, fit_seconds,
+                                                       history, forecast, params)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                    [(kind, name, _month_start(through), rows, f["fit_seconds"], json.dumps(f["history"]),
+                      json.dumps(f["forecast"]), json.dumps(f["params"])) for (kind, name), f in fitted.items()],
+                )
+            elapsed = time.perf_counter() - start
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+
+    metrics.observe("financebot_forecast_refit_seconds", elapsed)
+    _incr("refits")
+    _incr("series_fitted", len(fitted))
+    _last["last_refit_seconds"] = round(elapsed, 3)
+    return {"status": "refit", "rows": rows, "series": len(fitted), "seconds": round(elapsed, 3),
+            "trained_through": _month_start(through).isoformat()}
+
+
+def _run_scheduler():
+    while True:
+        try:
+            refit()
+        except Exception as e:
+            print("Forecast refit failed:", e)
+            _incr("errors")
+            _last["last_error"] = str(e)
+        _wake.wait(_check_seconds())
+        _wake.clear()
+
+
+def ensure_scheduler():
+    """Start this process's refit thread if it isn't running (once per worker, after fork)."""
+    global _scheduler_pid
+    if not scheduler_enabled() or _scheduler_pid == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler_pid != os.getpid():
+            threading.Thread(target=_run_scheduler, name="forecast-refit", daemon=True).start()
+            _scheduler_pid = os.getpid()
+
+
+def request_refit():
+    """Ask the scheduler to check now instead of at its next interval."""
+    ensure_scheduler()
+    _wake.set()
+
+
+# --- Reading ---
+
+def load_forecasts(conn=None) -> list:
+    """Stored forecasts (without model params), total first."""
+    if conn is None:
+        with connection() as conn:
+            return load_forecasts(conn)
+    rows = conn.execute("""
+        SELECT kind, name, fitted_at, trained_through, history, forecast
+        FROM spending_forecasts
+        ORDER BY kind DESC, name
+    """).fetchall()
+    return [{"kind": r[0], "name": r[1], "fitted_at": r[2], "trained_through": r[3],
+             "history": r[4], "forecast": r[5]} for r in rows]
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    args = argv if argv is not None else sys.argv[1:]
+    if args and args[0] == "refit" and set(args[1:]) <= {"--force"}:
+        print(refit(force="--force" in args))
+    elif args == ["show"]:
+        for f in load_forecasts():
+            label = f["name"] if f["kind"] == "category" else "(total)"
+            points = ", ".join(f"{m[:7]} {yhat:.0f}" for m, yhat, _, _ in f["forecast"])
+            print(f"{label:<24} through {f['trained_through']}: {points}")
+    else:
+        print("usage: python -m agents.forecast [refit [--force]|show]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
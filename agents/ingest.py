@@ -0,0 +1,259 @@
+import csv
+import datetime
+import json
+import re
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from psycopg import Rollback
+
+from agents.db import connection
+
+
+# Streaming bulk load into `transactions`. Rows are validated one at a time
+# and handed straight to a COPY into a temporary staging table, so memory
+# stays flat however long the input iterator is. One set-based INSERT then
+# moves across the rows whose fingerprint isn't already in the table: the
+# fingerprint is md5(transaction_key(date, amount, description, source) || n)
+# where n numbers identical keys in input order (migration 9), so
+# re-importing an overlapping statement skips what is already loaded. A load
+# with nothing new is rolled back to a savepoint, so it doesn't move the data
+# version or invalidate any cache.
+#
+# n restarts at 0 in every call, so identical rows are only told apart within
+# one (source, batch). `source` is the account a load comes from: pass it so
+# the same Netflix charge on two cards' statements is two transactions, and
+# send all of one account's rows for a period in one batch. Loads without a
+# source all share one namespace. A row that is really a second identical
+# transaction sent in a later batch can't be told from a re-import, so the
+# report lists the skipped rows for the caller to check; rows inserted without
+# a fingerprint (migration 12) always count as new.
+
+STAGING_SQL = """
+    CREATE TEMP TABLE transactions_staging (
+        seq BIGINT GENERATED ALWAYS AS IDENTITY,
+        amount NUMERIC, category TEXT, date DATE, description TEXT, source TEXT
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY transactions_staging (amount, category, date, description, source) FROM STDIN"
+
+FINGERPRINT_SQL = """
+    CREATE TEMP TABLE transactions_incoming ON COMMIT DROP AS
+    SELECT amount, category, date, description, source,
+           md5(k || '|' || (row_number() OVER (PARTITION BY k ORDER BY seq) - 1)) AS fingerprint
+    FROM (SELECT *, transaction_key(date, amount, description, source) AS k FROM transactions_staging) keyed
+"""
+
+# the unique index decides row by row, whatever the planner's stats say
+INSERT_SQL = """
+    WITH inserted AS (
+        INSERT INTO transactions (amount, category, date, description, source, fingerprint)
+        SELECT amount, category, date, description, source, fingerprint
+        FROM transactions_incoming
+        ON CONFLICT (fingerprint) DO NOTHING
+        RETURNING id
+    )
+    SELECT count(*), min(id), max(id) FROM inserted
+"""
+
+# incoming rows that matched a transaction this load didn't insert
+SKIPPED_SQL = """
+    SELECT i.date, i.amount, i.description
+    FROM transactions_incoming i JOIN transactions t USING (fingerprint)
+    WHERE t.id NOT BETWEEN %s AND %s
+    LIMIT %s
+"""
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%d %b %Y", "%d-%b-%Y", "%d %b %y", "%d-%b-%y", "%Y/%m/%d", "%m/%d/%Y")
+
+MAX_REPORTED_ERRORS = 20
+
+_CURRENCY_PREFIX = re.compile(r"^\s*(rs\.?|inr|usd|eur|gbp)\s*", re.IGNORECASE)
+_NON_NUMERIC = re.compile(r"[^0-9.+-]")
+
+
+def parse_amount(value) -> Decimal:
+    """Parse an amount; anything that isn't a finite number raises ValueError."""
+    if isinstance(value, bool):
+        raise ValueError(f"invalid amount {value!r}")
+    negative = False
+    try:
+        if isinstance(value, Decimal):
+            amount = value
+        elif isinstance(value, (int, float)):
+            amount = Decimal(str(value))
+        else:
+            text = str(value).strip()
+            negative = text.startswith("(") and text.endswith(")")
+            text = _CURRENCY_PREFIX.sub("", text.strip("()"))
+            amount = Decimal(_NON_NUMERIC.sub("", text))
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount {value!r}")
+    return -amount if negative else amount
+
+
+def parse_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date {value!r}")
+
+
+def _clean_text(value):
+    if value is None:
+        return None
+    text = " ".join(str(value).split())
+    return text or None
+
+
+def coerce_transaction(t: dict, source: str = None) -> tuple:
+    """Validate one transaction dict and return it as a COPY row.
+
+    A row's own "source" wins over the `source` passed in.
+    """
+    if not isinstance(t, dict):
+        raise ValueError(f"expected a dict, got {type(t).__name__}")
+    for key in ("amount", "date"):
+        if t.get(key) in (None, ""):
+            raise ValueError(f"missing {key}")
+    return (
+        parse_amount(t["amount"]),
+        _clean_text(t.get("category")),
+        parse_date(t["date"]),
+        _clean_text(t.get("description")),
+        _clean_text(t.get("source") or source),
+    )
+
+
+def copy_transactions(rows, on_progress=None, progress_every=10000, source: str = None) -> dict:
+    """Stream transaction dicts from any iterable into `transactions`.
+
+    Invalid rows are rejected and counted; rows already in the table (same
+    fingerprint) are skipped; everything else is loaded in a single
+    transaction. `source` (an account id) is recorded on rows that don't
+    name their own and is part of the fingerprint. Returns a report with accepted/inserted/skipped/rejected
+    counts, the first few skipped rows and accepted rows/sec. `on_progress(report)` is called every
+    `progress_every` accepted rows, before anything is inserted.
+    """
+    accepted = 0
+    inserted = 0
+    skipped = 0
+    rejected = 0
+    errors = []
+    skipped_rows = []
+    start = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - start
+        return {
+            "accepted": accepted,
+            "inserted": inserted,
+            "skipped": skipped,
+            "rejected": rejected,
+            "errors": errors,
+            "skipped_rows": skipped_rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(accepted / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+    with connection() as conn, conn.transaction():
+        conn.execute(STAGING_SQL)
+        with conn.cursor().copy(COPY_SQL) as copy:
+            for i, t in enumerate(rows):
+                try:
+                    row = coerce_transaction(t, source)
+                except (ValueError, TypeError) as e:
+                    rejected += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f"row {i}: {e}")
+                    continue
+                copy.write_row(row)
+                accepted += 1
+                if on_progress and accepted % progress_every == 0:
+                    on_progress(report())
+
+        conn.execute(FINGERPRINT_SQL)
+        with conn.transaction() as insert:
+            inserted, first_id, last_id = conn.execute(INSERT_SQL).fetchone()
+            if not inserted:
+                # undo the statement triggers' data version bump
+                raise Rollback(insert)
+        skipped = accepted - inserted
+        if skipped:
+            skipped_rows.extend(
+                f"{d} {amount} {description or ''}".rstrip()
+                for d, amount, description in conn.execute(SKIPPED_SQL, (first_id or 0, last_id or 0, MAX_REPORTED_ERRORS))
+            )
+
+    return report()
+
+
+def iter_file(path: str):
+    """Yield transaction dicts from a .csv, .jsonl or .json file."""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif lower.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif lower.endswith(".json"):
+        # plain JSON arrays can't be streamed without a parser dependency
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+
+
+def take_option(args: list, name: str):
+    """Remove `name VALUE` or `name=VALUE` from args and return VALUE (or None)."""
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            del args[i]
+            return args.pop(i)
+        if arg.startswith(name + "="):
+            return args.pop(i)[len(name) + 1:]
+    return None
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    paths = list(argv if argv is not None else sys.argv[1:])
+    source = take_option(paths, "--source")
+    if not paths:
+        print("usage: python -m agents.ingest [--source ACCOUNT] FILE [FILE ...]  (.csv, .jsonl or .json)")
+        return 2
+    for path in paths:
+        result = copy_transactions(
+            iter_file(path),
+            on_progress=lambda r: print(f"  {r['accepted']} rows, {r['rows_per_sec']} rows/sec"),
+            source=source,
+        )
+        print(f"{path}: inserted {result['inserted']}, skipped {result['skipped']} already loaded, "
+              f"rejected {result['rejected']} in {result['seconds']}s ({result['rows_per_sec']} rows/sec)")
+        for err in result["errors"]:
+            print("  " + err)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import functools
+import inspect
+import json
+import os
+import threading
+
+from cachetools import LRUCache, TTLCache
+
+from agents import metrics
+
+
+# Declarative result caching for tools whose output depends only on their
+# arguments (pure) or may be reused for a while (ttl). Put @memoize under
+# @tool:
+#
+#     @tool
+#     @memoize(file_args=("file_path",), max_chars=2_000_000)
+#     def text_parser_tool(file_path: str) -> str: ...
+#
+# Arguments named in `file_args` are keyed by the file's resolved path, mtime
+# and size, so editing or replacing the file misses. Each tool's cache is
+# bounded by the total length of the results it holds (`max_chars`), least
+# recently used first. Results that start with "Error" are not cached.
+
+EVENTS_METRIC = "financebot_tool_memo_events_total"
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Memo:
+    def __init__(self, name, ttl, max_chars):
+        self.name = name
+        sizeof = lambda value: max(1, len(value) if isinstance(value, str) else len(repr(value)))
+        if ttl is None:
+            self.cache = LRUCache(maxsize=max_chars, getsizeof=sizeof)
+        else:
+            self.cache = TTLCache(maxsize=max_chars, ttl=ttl, getsizeof=sizeof)
+        self.lock = threading.Lock()
+        self.ttl = ttl
+
+    def stats(self):
+        counts = metrics.counts(EVENTS_METRIC, ("hits", "misses"), tool=self.name)
+        hits, total = counts["hits"], counts["hits"] + counts["misses"]
+        with self.lock:
+            return dict(counts, hit_rate=round(hits / total, 3) if total else 0.0,
+                        entries=len(self.cache), chars=self.cache.currsize, ttl=self.ttl)
+
+
+def _enabled() -> bool:
+    return os.getenv("TOOL_MEMO", "1") != "0"
+
+
+def _file_key(path):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+
+
+def memoize(ttl: float = None, max_chars: int = 200_000, file_args=()):
+    """Cache a tool function's results; pure if `ttl` is None, else for `ttl` seconds."""
+    def decorator(func):
+        memo = _Memo(func.__name__, ttl, max_chars)
+        with _registry_lock:
+            _registry[func.__name__] = memo
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled():
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parts = []
+            for name, value in bound.arguments.items():
+                if name in file_args:
+                    value = _file_key(value)
+                    if value is None:
+                        # missing file: let the tool report it, don't cache
+                        return func(*args, **kwargs)
+                parts.append((name, value))
+            key = json.dumps(parts, sort_keys=True, default=str)
+
+            with memo.lock:
+                result = memo.cache.get(key)
+            metrics.incr(EVENTS_METRIC, event="hits" if result is not None else "misses", tool=memo.name)
+            if result is not None:
+                return result
+            result = func(*args, **kwargs)
+            if not (isinstance(result, str) and result.startswith("Error")):
+                with memo.lock:
+                    try:
+                        memo.cache[key] = result
+                    except ValueError:
+                        pass  # larger than the whole budget
+            return result
+
+        wrapper.cache_stats = memo.stats
+        return wrapper
+    return decorator
+
+
+def memo_stats() -> dict:
+    """Per-tool hits, misses, hit rate and cache size."""
+    with _registry_lock:
+        memos = dict(_registry)
+    return {name: memo.stats() for name, memo in memos.items()}
@@ -0,0 +1,174 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Process-local latency histograms and counters, rendered in the Prometheus
+# text format by app.py's /metrics route. Hot paths record into them:
+#   financebot_http_request_duration_seconds  Flask routes
+#   financebot_graph_node_duration_seconds    LangGraph nodes (chatbot = LLM)
+#   financebot_tool_duration_seconds          each tool call, plus errors
+#   financebot_sql_duration_seconds           SQL tool and chart queries
+#   financebot_checkpoint_duration_seconds    checkpointer reads and writes
+#   financebot_analytics_*_seconds            analytics frame loads and analyses
+#   financebot_forecast_refit_seconds         background Prophet refits
+# and the modules' event counters (cache hits, loads, evictions, ...) are
+# financebot_<module>_events_total{event=...}; their /stats views read them
+# back with counts(), so each number is kept once. Under gunicorn every
+# worker has its own registry; scrape each worker or aggregate by instance.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "financebot_http_request_duration_seconds": "Flask request latency by route, method and status.",
+    "financebot_graph_node_duration_seconds": "LangGraph node latency; the chatbot node is the LLM call.",
+    "financebot_tool_duration_seconds": "Tool call latency by tool.",
+    "financebot_tool_errors_total": "Tool calls that failed or timed out, by tool.",
+    "financebot_sql_duration_seconds": "SQL statement latency by source.",
+    "financebot_sql_errors_total": "SQL statements that failed, by source.",
+    "financebot_checkpoint_duration_seconds": "Checkpointer operation latency by operation.",
+    "financebot_analytics_refresh_seconds": "Analytics frame load time by mode (full or incremental).",
+    "financebot_analytics_duration_seconds": "Analytics computation time by analysis, on a result-cache miss.",
+    "financebot_forecast_refit_seconds": "Time to refit and store every forecast series.",
+    "financebot_db_pool_events_total": "Pool checkouts and idle-connection health checks.",
+    "financebot_pdf_cache_events_total": "PDF text cache hits, misses, evictions and pages extracted.",
+    "financebot_scratch_cache_events_total": "Scratch directory writes and evictions (count and bytes).",
+    "financebot_query_engine_events_total": "SQL tool queries, writes, truncated results, timeouts and errors.",
+    "financebot_sql_cache_events_total": "SQL tool result cache hits, misses and uncacheable queries.",
+    "financebot_chart_cache_events_total": "Chart response cache hits, misses and 304s.",
+    "financebot_tool_memo_events_total": "Tool result memo hits and misses, by tool.",
+    "financebot_context_events_total": "Context trims and the messages they evicted or removed.",
+    "financebot_search_events_total": "Merchant searches, fuzzy fallbacks, no-match searches and vocabulary loads.",
+    "financebot_analytics_events_total": "Analytics frame loads, appended rows and result cache hits/misses.",
+    "financebot_forecast_events_total": "Forecast refit checks and their outcomes.",
+}
+
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}    # (name, labels) -> value
+_lock = threading.Lock()
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    key = (name, _labels(labels))
+    i = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        h[i] += 1
+        h[-1] += seconds
+
+
+def incr(name: str, n: float = 1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def counts(name: str, keys=(), label: str = "event", **where) -> dict:
+    """Counter `name` by `label`, summed over its other labels (or only those
+    matching `where`). Every key in `keys` is present, 0 if never counted."""
+    want = _labels(where)
+    out = dict.fromkeys(keys, 0)
+    with _lock:
+        for (n, labels), value in _counters.items():
+            if n == name and all(pair in labels for pair in want):
+                k = dict(labels).get(label)
+                out[k] = out.get(k, 0) + value
+    return out
+
+
+def histogram_totals(name: str, label: str) -> dict:
+    """{label value: (count, sum)} of histogram `name`, summed over its other labels."""
+    out = {}
+    with _lock:
+        for (n, labels), h in _histograms.items():
+            if n == name:
+                k = dict(labels).get(label)
+                count, total = out.get(k, (0, 0.0))
+                out[k] = (count + sum(h[:-1]), total + h[-1])
+    return out
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """Observe the duration of the block under `name`, even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _fmt_value(v):
+    if isinstance(v, bool):
+        return str(int(v))
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render(gauges: dict = None) -> str:
+    """Prometheus text exposition (format 0.0.4) of everything recorded.
+
+    `gauges` adds point-in-time values as {name: {labels tuple or (): value}}.
+    """
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({k[0] for k in histograms}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), h[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(bound)
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h[-1])}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+
+    for name in sorted({k[0] for k in counters}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    for name, values in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _new_lock_after_fork():
+    # the parent may have forked while another thread held the lock
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_lock_after_fork)
@@ -0,0 +1,407 @@
+import json
+import sys
+
+from agents import rollup
+from agents.db import connection
+
+
+# Versioned schema for the app's own tables. Each entry runs once, in its own
+# transaction, and is recorded in schema_migrations. Never edit an applied
+# migration; append a new one instead. Run at deploy time with
+#     python -m agents.migrations
+# which also creates/upgrades the LangGraph checkpointer and store tables, so
+# web workers never run DDL on startup.
+
+# CREATE TABLE IF NOT EXISTS leaves a `transactions` table that predates the
+# migrations as it was. Later migrations, the analytics id watermark and
+# search rely on these columns, so bring such a table up to them. Run by
+# migration 2 and again ahead of migration 9 (the first to need `id`), for
+# deployments that applied 2 before it did this; both are no-ops otherwise.
+_TRANSACTIONS_COLUMNS = """
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS id SERIAL;
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS date DATE;
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS amount NUMERIC;
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category TEXT;
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS description TEXT;
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_index WHERE indrelid = 'transactions'::regclass AND indisprimary) THEN
+            ALTER TABLE transactions ADD PRIMARY KEY (id);
+        END IF;
+    END
+    $$;
+"""
+
+MIGRATIONS = [
+    (1, "users table", """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        );
+    """),
+    (2, "transactions table", """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id SERIAL PRIMARY KEY,
+            date DATE,
+            amount NUMERIC,
+            category TEXT,
+            description TEXT
+        );
+    """ + _TRANSACTIONS_COLUMNS),
+    (3, "transactions date/category indexes", """
+        ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category_norm TEXT
+            GENERATED ALWAYS AS (lower(coalesce(category, ''))) STORED;
+        CREATE INDEX IF NOT EXISTS transactions_date_idx ON transactions (date);
+        CREATE INDEX IF NOT EXISTS transactions_category_expr_idx
+            ON transactions ((lower(coalesce(category, ''))));
+        CREATE INDEX IF NOT EXISTS transactions_category_norm_date_idx
+            ON transactions (category_norm, date);
+    """),
+    (4, "expense rollup", """
+        CREATE TABLE IF NOT EXISTS expense_rollup (
+            month DATE NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            total NUMERIC NOT NULL DEFAULT 0,
+            txn_count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, category)
+        );
+
+        CREATE OR REPLACE FUNCTION expense_rollup_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO expense_rollup AS r (month, category, total, txn_count)
+                SELECT date_trunc('month', date)::date, coalesce(category, ''),
+                       -coalesce(SUM(ABS(amount)), 0), -COUNT(*)
+                FROM old_rows
+                WHERE date IS NOT NULL
+                  AND lower(coalesce(category, '')) NOT IN ('self transfer', 'self-transfer', 'transfers', 'money received')
+                GROUP BY 1, 2
+                ON CONFLICT (month, category) DO UPDATE
+                SET total = r.total + EXCLUDED.total, txn_count = r.txn_count + EXCLUDED.txn_count;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO expense_rollup AS r (month, category, total, txn_count)
+                SELECT date_trunc('month', date)::date, coalesce(category, ''),
+                       coalesce(SUM(ABS(amount)), 0), COUNT(*)
+                FROM new_rows
+                WHERE date IS NOT NULL
+                  AND lower(coalesce(category, '')) NOT IN ('self transfer', 'self-transfer', 'transfers', 'money received')
+                GROUP BY 1, 2
+                ON CONFLICT (month, category) DO UPDATE
+                SET total = r.total + EXCLUDED.total, txn_count = r.txn_count + EXCLUDED.txn_count;
+            END IF;
+            RETURN NULL;
+        END
+        $$;
+
+        CREATE OR REPLACE FUNCTION expense_rollup_truncate() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM expense_rollup;
+            RETURN NULL;
+        END
+        $$;
+
+        -- transition tables only allow one event per trigger
+        DROP TRIGGER IF EXISTS expense_rollup_ins ON transactions;
+        CREATE TRIGGER expense_rollup_ins AFTER INSERT ON transactions
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+
+        DROP TRIGGER IF EXISTS expense_rollup_upd ON transactions;
+        CREATE TRIGGER expense_rollup_upd AFTER UPDATE ON transactions
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+
+        DROP TRIGGER IF EXISTS expense_rollup_del ON transactions;
+        CREATE TRIGGER expense_rollup_del AFTER DELETE ON transactions
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+
+        DROP TRIGGER IF EXISTS expense_rollup_trunc ON transactions;
+        CREATE TRIGGER expense_rollup_trunc AFTER TRUNCATE ON transactions
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_truncate();
+
+        -- backfill from existing history
+        LOCK TABLE transactions IN SHARE MODE;
+        DELETE FROM expense_rollup;
+        INSERT INTO expense_rollup (month, category, total, txn_count)
+        SELECT date_trunc('month', date)::date, coalesce(category, ''),
+               coalesce(SUM(ABS(amount)), 0), COUNT(*)
+        FROM transactions
+        WHERE date IS NOT NULL
+          AND lower(coalesce(category, '')) NOT IN ('self transfer', 'self-transfer', 'transfers', 'money received')
+        GROUP BY 1, 2;
+    """),
+    (5, "data version", """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        INSERT INTO data_version (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE data_version SET version = version + 1, updated_at = now() WHERE id = 1;
+            RETURN NULL;
+        END
+        $$;
+
+        DROP TRIGGER IF EXISTS transactions_data_version ON transactions;
+        CREATE TRIGGER transactions_data_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON transactions
+            FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump();
+    """),
+    (6, "data version rewrites", """
+        -- rewrite_version moves only on UPDATE/DELETE/TRUNCATE, so readers that
+        -- append new rows by id (agents/analytics.py) know when that isn't enough
+        ALTER TABLE data_version ADD COLUMN IF NOT EXISTS rewrite_version BIGINT NOT NULL DEFAULT 0;
+
+        CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE data_version
+            SET version = version + 1,
+                rewrite_version = rewrite_version + CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE 1 END,
+                updated_at = now()
+            WHERE id = 1;
+            RETURN NULL;
+        END
+        $$;
+    """),
+    (7, "spending forecasts", """
+        CREATE TABLE IF NOT EXISTS spending_forecasts (
+            kind TEXT NOT NULL,               -- 'total' or 'category'
+            name TEXT NOT NULL DEFAULT '',    -- the category; '' for the total
+            fitted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            trained_through DATE NOT NULL,    -- last complete month in the history
+            rows_at_fit BIGINT NOT NULL,
+            fit_seconds REAL NOT NULL,
+            history JSONB NOT NULL,           -- [[month, total], ...]
+            forecast JSONB NOT NULL,          -- [[month, yhat, lower, upper], ...]
+            params JSONB NOT NULL,            -- prophet.serialize.model_to_json
+            PRIMARY KEY (kind, name)
+        );
+    """),
+    (8, "merchant column and search index", """
+        -- "UPI-AMAZON PAY-1234" -> "amazon pay"; agents/search.py mirrors this for queries
+        CREATE OR REPLACE FUNCTION normalize_merchant(description TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE RETURNS NULL ON NULL INPUT AS $$
+            SELECT btrim(regexp_replace(regexp_replace(
+                regexp_replace(lower(description), '[^a-z]+', ' ', 'g'),
+                '\\m(upi|neft|imps|rtgs|pos|ach|nach|ecs|ref|txn|dr|cr)\\M', ' ', 'g'), ' +', ' ', 'g'))
+        $$;
+
+        ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant TEXT
+            GENERATED ALWAYS AS (normalize_merchant(description)) STORED;
+        CREATE INDEX IF NOT EXISTS transactions_merchant_idx ON transactions (merchant);
+        CREATE INDEX IF NOT EXISTS transactions_merchant_search_idx
+            ON transactions USING gin (to_tsvector('simple', coalesce(merchant, '')));
+    """),
+    (9, "transaction fingerprints", _TRANSACTIONS_COLUMNS + """
+        -- What makes two rows the same transaction. The fingerprint adds the
+        -- row's ordinal among equal keys, so two identical coffees on one day
+        -- stay two rows while re-importing that day is still a no-op.
+        CREATE OR REPLACE FUNCTION transaction_key(d DATE, amount NUMERIC, description TEXT, source TEXT)
+        RETURNS TEXT LANGUAGE sql STABLE PARALLEL SAFE AS $$
+            SELECT concat_ws('|', to_char(d, 'YYYY-MM-DD'), round(amount, 2)::text,
+                             lower(regexp_replace(btrim(coalesce(description, '')), '\\s+', ' ', 'g')),
+                             coalesce(source, ''))
+        $$;
+
+        ALTER TABLE transactions ADD COLUMN IF NOT EXISTS source TEXT;
+        ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+
+        -- backfill; the rollup doesn't change, so skip its per-statement rework
+        ALTER TABLE transactions DISABLE TRIGGER expense_rollup_upd;
+        UPDATE transactions t SET fingerprint = f.fingerprint
+        FROM (
+            SELECT id, md5(k || '|' || (row_number() OVER (PARTITION BY k ORDER BY id) - 1)) AS fingerprint
+            FROM (
+                SELECT id, transaction_key(date, amount, description, source) AS k
+                FROM transactions
+                WHERE date IS NOT NULL AND amount IS NOT NULL
+            ) keyed
+        ) f
+        WHERE t.id = f.id;
+        ALTER TABLE transactions ENABLE TRIGGER expense_rollup_upd;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS transactions_fingerprint_idx ON transactions (fingerprint);
+    """),
+    # migration 4 wrote the exclusion list out by hand; from here on the trigger
+    # and the rebuild are generated from rollup.EXCLUDED_CATEGORIES
+    (10, "rollup generated from EXCLUDED_CATEGORIES", rollup.sync_sql()),
+    # salary and refund credits are income, not spend
+    (11, "exclude salary and refund from the rollup", rollup.sync_sql()),
+    (12, "fingerprint rows inserted without one", """
+        -- A row written without a fingerprint (an INSERT from the SQL tool) is
+        -- a new transaction by definition, so it takes the first ordinal of
+        -- its key that is still free; a later import of the same row then
+        -- counts it as already loaded.
+        CREATE OR REPLACE FUNCTION next_fingerprint(k TEXT) RETURNS TEXT
+        LANGUAGE plpgsql VOLATILE AS $$
+        DECLARE
+            n INTEGER := 0;
+        BEGIN
+            WHILE EXISTS (SELECT 1 FROM transactions WHERE fingerprint = md5(k || '|' || n)) LOOP
+                n := n + 1;
+            END LOOP;
+            RETURN md5(k || '|' || n);
+        END
+        $$;
+
+        CREATE OR REPLACE FUNCTION transactions_fingerprint() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF NEW.date IS NOT NULL AND NEW.amount IS NOT NULL THEN
+                NEW.fingerprint := next_fingerprint(
+                    transaction_key(NEW.date, NEW.amount, NEW.description, NEW.source));
+            END IF;
+            RETURN NEW;
+        END
+        $$;
+
+        DROP TRIGGER IF EXISTS transactions_fingerprint ON transactions;
+        CREATE TRIGGER transactions_fingerprint BEFORE INSERT ON transactions
+            FOR EACH ROW WHEN (NEW.fingerprint IS NULL) EXECUTE FUNCTION transactions_fingerprint();
+
+        -- rows inserted that way since migration 9
+        ALTER TABLE transactions DISABLE TRIGGER expense_rollup_upd;
+        UPDATE transactions
+        SET fingerprint = next_fingerprint(transaction_key(date, amount, description, source))
+        WHERE fingerprint IS NULL AND date IS NOT NULL AND amount IS NOT NULL;
+        ALTER TABLE transactions ENABLE TRIGGER expense_rollup_upd;
+    """),
+]
+
+# arbitrary key so two deploys can't migrate concurrently
+_LOCK_KEY = 72_410_004
+
+
+def applied_versions(conn) -> set:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    return {r[0] for r in conn.execute("SELECT version FROM schema_migrations").fetchall()}
+
+
+def migrate(conn=None) -> list:
+    """Apply pending migrations in order and return the versions applied."""
+    if conn is None:
+        with connection() as conn:
+            return migrate(conn)
+
+    applied = []
+    conn.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+    try:
+        done = applied_versions(conn)
+        for version, name, sql in MIGRATIONS:
+            if version in done:
+                continue
+            with conn.transaction():
+                conn.execute(sql)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+            print(f"Applied migration {version}: {name}")
+            applied.append(version)
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    return applied
+
+
+# Representative dashboard/analytics queries and the tables they must reach
+# through an index rather than a sequential scan. tests/test_migrations.py
+# checks the planner picks those indexes on a realistically sized table.
+EXPLAIN_QUERIES = {
+    "monthly totals (rollup)": (
+        "SELECT month, SUM(total) FROM expense_rollup WHERE month >= %s AND txn_count > 0 GROUP BY month",
+        ("2025-01-01",),
+    ),
+    "category totals (rollup)": (
+        "SELECT category, total FROM expense_rollup WHERE month = %s AND txn_count > 0 ORDER BY total DESC LIMIT 5",
+        ("2025-01-01",),
+    ),
+    "transactions by date range": (
+        "SELECT date_trunc('month', date), SUM(ABS(amount)) FROM transactions WHERE date >= %s GROUP BY 1",
+        ("2025-01-01",),
+    ),
+    "transactions by normalized category": (
+        "SELECT SUM(ABS(amount)) FROM transactions WHERE lower(coalesce(category, '')) = %s",
+        ("food",),
+    ),
+    "transactions by category column and month": (
+        "SELECT SUM(ABS(amount)) FROM transactions WHERE category_norm = %s AND date >= %s AND date < %s",
+        ("food", "2025-01-01", "2025-02-01"),
+    ),
+    "merchant search": (
+        "SELECT count(*) FROM transactions WHERE to_tsvector('simple', coalesce(merchant, '')) @@ to_tsquery('simple', %s)",
+        ("amazon:*",),
+    ),
+}
+
+
+def _scan_nodes(plan):
+    nodes = [(plan["Node Type"], plan.get("Relation Name"), plan.get("Index Name"))]
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return [n for n in nodes if "Scan" in n[0]]
+
+
+def explain_queries(conn=None) -> dict:
+    """EXPLAIN each query in EXPLAIN_QUERIES with the default planner settings.
+
+    Returns {name: {"scans": [...], "uses_index": bool}}. Plans depend on the
+    table's statistics, so ANALYZE after a bulk load before trusting them.
+    """
+    if conn is None:
+        with connection() as conn:
+            return explain_queries(conn)
+
+    results = {}
+    with conn.transaction():
+        for name, (sql, params) in EXPLAIN_QUERIES.items():
+            plan = conn.execute("EXPLAIN (FORMAT JSON) " + sql, params).fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _scan_nodes(plan[0]["Plan"])
+            results[name] = {
+                "scans": [t + (f" on {rel}" if rel else "") + (f" using {idx}" if idx else "") for t, rel, idx in scans],
+                "uses_index": bool(scans) and all(t != "Seq Scan" for t, _, _ in scans),
+            }
+    return results
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    args = argv if argv is not None else sys.argv[1:]
+    if not args or args == ["migrate"]:
+        applied = migrate()
+        print(f"{len(applied)} migration(s) applied." if applied else "Schema is up to date.")
+        from agents.chatbot import setup_agent_storage
+        setup_agent_storage()
+        print("Checkpointer and store tables are up to date.")
+        return 0
+    if args == ["explain"]:
+        ok = True
+        for name, result in explain_queries().items():
+            ok = ok and result["uses_index"]
+            print(f"[{'ok' if result['uses_index'] else 'SEQ SCAN'}] {name}: {'; '.join(result['scans'])}")
+        return 0 if ok else 1
+    print("usage: python -m agents.migrations [migrate|explain]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
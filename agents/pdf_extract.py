@@ -0,0 +1,159 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from agents import metrics
+from agents.cache_dir import atomic_write
+
+
+# PDF text extraction for text_parser_tool. Pages are extracted exactly once,
+# large files are split into page ranges across a process pool, and results
+# are cached on disk by the SHA-256 of the file's bytes, so asking about the
+# same statement again never reaches pdfplumber. The cache is trimmed to a
+# byte budget, least recently used first.
+
+HASH_CHUNK = 1 << 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+EVENTS_METRIC = "financebot_pdf_cache_events_total"
+EVENTS = ("hits", "misses", "pages_extracted", "evictions")
+
+
+def cache_dir() -> str:
+    return os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "financebot", "pdf_text"))
+
+
+def _max_cache_bytes() -> int:
+    return int(os.getenv("PDF_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def _workers() -> int:
+    # every web worker has its own pool, so by default they split the CPUs
+    # (gunicorn takes its worker count from WEB_CONCURRENCY)
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    default = max(1, (os.cpu_count() or 1) // web_workers)
+    return int(os.getenv("PDF_WORKERS", str(default)))
+
+
+def _min_pages_per_worker() -> int:
+    return int(os.getenv("PDF_MIN_PAGES_PER_WORKER", "8"))
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def pdf_cache_stats() -> dict:
+    return metrics.counts(EVENTS_METRIC, EVENTS)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _get_executor():
+    # forkserver/spawn rather than fork: the web process has live threads and
+    # pooled DB connections that must not be copied into the workers
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                _executor = ProcessPoolExecutor(max_workers=_workers(), mp_context=ctx)
+    return _executor
+
+
+def extract_page_range(path: str, start: int, end: int) -> list:
+    """Extract text for pages [start, end) of a PDF; runs in a worker process."""
+    import pdfplumber
+
+    texts = []
+    with pdfplumber.open(path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            texts.append(page.extract_text() or "")
+            # drop parsed layout objects so memory stays flat on long ranges
+            page.close()
+    return texts
+
+
+def _page_count(path: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract(path: str) -> list:
+    n_pages = _page_count(path)
+    n_chunks = min(_workers(), max(1, n_pages // _min_pages_per_worker()))
+    if n_chunks <= 1:
+        return extract_page_range(path, 0, n_pages)
+
+    step = -(-n_pages // n_chunks)
+    ranges = [(s, min(s + step, n_pages)) for s in range(0, n_pages, step)]
+    executor = _get_executor()
+    futures = [executor.submit(extract_page_range, path, s, e) for s, e in ranges]
+    pages = []
+    for f in futures:
+        pages.extend(f.result())
+    return pages
+
+
+def _evict(directory: str, keep: str):
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        full = os.path.join(directory, name)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(size for _, size, _ in entries)
+    for _, size, full in sorted(entries):
+        if total <= _max_cache_bytes():
+            break
+        if full == keep:
+            continue
+        try:
+            os.remove(full)
+            total -= size
+            _incr("evictions")
+        except FileNotFoundError:
+            pass
+
+
+def extract_pdf_pages(path: str) -> list:
+    """Return the text of every page of the PDF at `path`, using the cache."""
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    cached = os.path.join(directory, file_digest(path) + ".json")
+
+    try:
+        with open(cached, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        os.utime(cached)  # mark as recently used
+        _incr("hits")
+        return pages
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    _incr("misses")
+    pages = _extract(path)
+    _incr("pages_extracted", len(pages))
+
+    atomic_write(cached, json.dumps(pages))
+    _evict(directory, keep=cached)
+    return pages
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+# A small sampling profiler for one thread, used to profile single requests
+# on demand. A daemon thread snapshots the target thread's stack every
+# PROFILE_INTERVAL_MS and counts identical stacks; the result is written in
+# collapsed-stack format ("outer;inner;leaf count" per line), which
+# flamegraph.pl and speedscope read directly. Only enabled when
+# PROFILING_ENABLED=1, because every sample walks the stack.
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("PROFILING_ENABLED", "0") == "1"
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "financebot", "profiles"))
+
+
+def _interval() -> float:
+    return float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or _interval()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def save(self, name: str = "profile") -> str:
+        """Write the collapsed stacks under PROFILE_DIR and return the path."""
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        return path
@@ -0,0 +1,215 @@
+import json
+import os
+import re
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg import DatabaseError
+from psycopg.errors import QueryCanceled
+
+from agents import metrics
+from agents.db import connection
+from agents.data_version import bump_data_version
+
+
+# Executes the SQL the LLM writes without letting one query take the worker's
+# memory or the prompt with it. Every statement runs in its own transaction
+# with SET LOCAL statement_timeout. Reads go through a named (server-side)
+# cursor and are fetched in batches: results under SQL_MAX_ROWS / SQL_MAX_BYTES
+# come back whole, anything larger comes back as a row count, per-column stats
+# and a sample, with a notice saying so. Stats are computed while streaming,
+# up to SQL_SCAN_MAX_ROWS rows.
+
+FETCH_BATCH = 2000
+TOP_VALUES = 5
+MAX_DISTINCT_TRACKED = 1000
+
+READ_START = re.compile(r"^\s*(select|values|table|with)\b", re.IGNORECASE)
+DML_WORD = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+# literals, quoted identifiers and comments, which may contain any word
+_NOT_CODE = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|(\$\w*\$).*?\1|--[^\n]*|/\*.*?\*/""", re.DOTALL)
+
+EVENTS_METRIC = "financebot_query_engine_events_total"
+EVENTS = ("queries", "writes", "truncated", "timeouts", "errors")
+
+
+def _max_rows() -> int:
+    return int(os.getenv("SQL_MAX_ROWS", "200"))
+
+
+def _max_bytes() -> int:
+    return int(os.getenv("SQL_MAX_BYTES", "32000"))
+
+
+def _sample_rows() -> int:
+    return int(os.getenv("SQL_SAMPLE_ROWS", "20"))
+
+
+def _scan_max_rows() -> int:
+    return int(os.getenv("SQL_SCAN_MAX_ROWS", "100000"))
+
+
+def statement_timeout_ms() -> int:
+    return int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def query_stats() -> dict:
+    return metrics.counts(EVENTS_METRIC, EVENTS)
+
+
+def is_read_query(query: str) -> bool:
+    # DECLARE CURSOR only accepts plain reads; a WITH that modifies data is a write
+    code = _NOT_CODE.sub(" ", query)
+    m = READ_START.match(code)
+    if not m:
+        return False
+    return m.group(1).lower() != "with" or not DML_WORD.search(code)
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+class _ColumnStats:
+    """Running stats for one result column."""
+
+    def __init__(self):
+        self.nulls = 0
+        self.min = self.max = None
+        self.sum = 0
+        self.numeric = True
+        self.values = Counter()
+        self.distinct_overflow = False
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+            return
+        try:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        except TypeError:
+            pass
+        if self.numeric and isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            self.sum += value
+        else:
+            self.numeric = False
+        if not self.distinct_overflow:
+            key = value if isinstance(value, (str, int, float, Decimal, date, bool)) else str(value)
+            self.values[key] += 1
+            if len(self.values) > MAX_DISTINCT_TRACKED:
+                self.distinct_overflow = True
+                self.values = Counter()
+
+    def summary(self, n_rows):
+        out = {"nulls": self.nulls, "min": _jsonable(self.min), "max": _jsonable(self.max)}
+        non_null = n_rows - self.nulls
+        if self.numeric and non_null:
+            out["sum"] = _jsonable(self.sum)
+            out["mean"] = round(float(self.sum) / non_null, 4)
+        out["distinct"] = f">{MAX_DISTINCT_TRACKED}" if self.distinct_overflow else len(self.values)
+        if not self.numeric and not self.distinct_overflow:
+            out["top"] = [[_jsonable(v), c] for v, c in self.values.most_common(TOP_VALUES)]
+        return out
+
+
+def _read(cur, columns):
+    max_rows, max_bytes = _max_rows(), _max_bytes()
+    scan_max = _scan_max_rows()
+    rows, size, truncated = [], 0, False
+    stats = [_ColumnStats() for _ in columns]
+    n = 0
+    exhausted = True
+    while True:
+        batch = cur.fetchmany(FETCH_BATCH)
+        if not batch:
+            break
+        for row in batch:
+            n += 1
+            for s, v in zip(stats, row):
+                s.add(v)
+            if not truncated:
+                row = [_jsonable(v) for v in row]
+                size += len(json.dumps(row, default=str))
+                if len(rows) >= max_rows or size > max_bytes:
+                    truncated = True
+                else:
+                    rows.append(row)
+        if n >= scan_max:
+            exhausted = False
+            break
+
+    if not truncated:
+        return {"columns": columns, "rows": rows, "row_count": n}
+
+    _incr("truncated")
+    sample = rows[:_sample_rows()]
+    count = n if exhausted else f">={n}"
+    return {
+        "columns": columns,
+        "row_count": count,
+        "truncated": True,
+        "notice": (f"Result has {count} rows, over the limit of {max_rows} rows / {max_bytes} bytes; "
+                   f"showing column stats and the first {len(sample)} rows. "
+                   "Use aggregates, WHERE or LIMIT to get specific rows."),
+        "column_stats": {c: s.summary(n) for c, s in zip(columns, stats)},
+        "sample": sample,
+    }
+
+
+def run_query(query: str, params=None, conn=None) -> dict:
+    """Run one statement with the timeout and size limits applied.
+
+    Reads return {"columns", "rows", "row_count"} or, when over the limits,
+    {"columns", "row_count", "truncated", "notice", "column_stats", "sample"}.
+    Writes return {"rowcount"} plus capped "rows" if the statement returns any.
+    """
+    if conn is None:
+        with connection() as conn:
+            return run_query(query, params, conn)
+
+    _incr("queries")
+    try:
+        with metrics.timed("financebot_sql_duration_seconds", source="tool"):
+            return _run(conn, query, params)
+    except QueryCanceled:
+        _incr("timeouts")
+        metrics.incr("financebot_sql_errors_total", source="tool", reason="timeout")
+        raise
+    except DatabaseError:
+        _incr("errors")
+        metrics.incr("financebot_sql_errors_total", source="tool", reason="error")
+        raise
+
+
+def _run(conn, query, params):
+    with conn.transaction():
+        conn.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms())}")
+        if is_read_query(query):
+            with conn.cursor(name="llm_query") as cur:
+                cur.itersize = FETCH_BATCH
+                cur.execute(query, params)
+                columns = [d.name for d in cur.description]
+                return _read(cur, columns)
+
+        _incr("writes")
+        cur = conn.execute(query, params)
+        result = {"rowcount": cur.rowcount}
+        if cur.description:
+            result.update(_read(cur, [d.name for d in cur.description]))
+        # writes can change what cached charts and queries return
+        bump_data_version(conn)
+        return result
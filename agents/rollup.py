@@ -0,0 +1,97 @@
+import sys
+
+from agents.db import connection
+
+
+# Spending totals per (month, category), kept in step with `transactions` by
+# statement-level triggers (see migration 4 in agents/migrations.py). Every
+# write path (COPY ingestion, the SQL tool, manual psql) goes through the same
+# triggers, and each statement costs one grouped upsert over its transition
+# table instead of a rescan of history. The dashboard reads only this table.
+
+# Categories that are money moving between own accounts or income, never spend.
+# The trigger function and the rebuild below are both generated from this; after
+# changing it, add a migration that runs sync_sql() (see migration 10).
+EXCLUDED_CATEGORIES = ("self transfer", "self-transfer", "transfers", "money received", "salary", "refund")
+
+EXCLUDED_SQL = ", ".join(f"'{c}'" for c in EXCLUDED_CATEGORIES)
+
+_SPEND_FILTER = f"date IS NOT NULL AND lower(coalesce(category, '')) NOT IN ({EXCLUDED_SQL})"
+
+
+def _grouped(source: str, sign: str = "") -> str:
+    return f"""
+        SELECT date_trunc('month', date)::date, coalesce(category, ''),
+               {sign}coalesce(SUM(ABS(amount)), 0), {sign}COUNT(*)
+        FROM {source}
+        WHERE {_SPEND_FILTER}
+        GROUP BY 1, 2"""
+
+
+_UPSERT = """
+        ON CONFLICT (month, category) DO UPDATE
+        SET total = r.total + EXCLUDED.total, txn_count = r.txn_count + EXCLUDED.txn_count;"""
+
+# statement-level trigger body: subtract old_rows, add new_rows
+APPLY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION expense_rollup_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO expense_rollup AS r (month, category, total, txn_count)
+        {_grouped("old_rows", "-")}{_UPSERT}
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO expense_rollup AS r (month, category, total, txn_count)
+        {_grouped("new_rows")}{_UPSERT}
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+REBUILD_SQL = f"""
+INSERT INTO expense_rollup (month, category, total, txn_count)
+{_grouped("transactions")}
+"""
+
+
+def sync_sql() -> str:
+    """Migration SQL that brings the trigger and the table in line with EXCLUDED_CATEGORIES."""
+    return (APPLY_FUNCTION_SQL + "\nLOCK TABLE transactions IN SHARE MODE;\n"
+            "DELETE FROM expense_rollup;\n" + REBUILD_SQL + ";")
+
+# arbitrary key so two rebuilds can't interleave
+_LOCK_KEY = 72_410_003
+
+
+def _rebuild(conn):
+    # SHARE mode blocks writers (and therefore the triggers) until the rebuild commits
+    conn.execute("LOCK TABLE transactions IN SHARE MODE")
+    conn.execute("DELETE FROM expense_rollup")
+    conn.execute(REBUILD_SQL)
+
+
+def rebuild_rollup():
+    """Recompute the whole rollup from `transactions` in one transaction."""
+    with connection() as conn, conn.transaction():
+        conn.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+        _rebuild(conn)
+        return conn.execute("SELECT COUNT(*) FROM expense_rollup").fetchone()[0]
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    args = argv if argv is not None else sys.argv[1:]
+    if args == ["rebuild"]:
+        print(f"Rebuilt expense_rollup: {rebuild_rollup()} (month, category) rows.")
+    else:
+        print("usage: python -m agents.rollup rebuild")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import difflib
+import re
+import threading
+from datetime import date
+
+from agents import metrics
+from agents.db import connection
+from agents.data_version import current_data_version
+
+
+# Merchant search over `transactions`, so "how much did I spend at Amazon"
+# doesn't become an ILIKE '%amazon%' seq scan. Migration 8 stores a
+# normalized `merchant` per row ("UPI-AMAZON PAY-1234" -> "amazon pay") and
+# indexes it for full-text search. A query is normalized the same way and
+# every word is matched as a prefix ("amaz" finds "amazon"). If that finds
+# nothing, each word is swapped for the closest known merchant words
+# ("amazn" -> "amazon"), from a vocabulary cached per data version. Results
+# are merchants ranked by relevance and count, the totals, and one page of
+# matching transactions, newest first.
+
+RAIL_WORDS = {"upi", "neft", "imps", "rtgs", "pos", "ach", "nach", "ecs", "ref", "txn", "dr", "cr"}
+_NON_LETTERS = re.compile(r"[^a-z]+")
+
+MATCH_SQL = "to_tsvector('simple', coalesce(merchant, '')) @@ to_tsquery('simple', %(q)s)"
+
+MAX_PAGE_SIZE = 100
+MAX_MERCHANTS = 10
+FUZZY_CUTOFF = 0.75
+FUZZY_ALTERNATIVES = 3
+
+_vocabulary = (None, ())  # (data version, sorted merchant words)
+_vocabulary_lock = threading.Lock()
+
+EVENTS_METRIC = "financebot_search_events_total"
+EVENTS = ("searches", "fuzzy", "no_match", "vocabulary_loads")
+
+
+def _incr(name, n=1):
+    metrics.incr(EVENTS_METRIC, n, event=name)
+
+
+def search_stats() -> dict:
+    return dict(metrics.counts(EVENTS_METRIC, EVENTS), vocabulary_words=len(_vocabulary[1]))
+
+
+def normalize_merchant(text: str) -> str:
+    """Python twin of the normalize_merchant() SQL function in migration 8."""
+    words = _NON_LETTERS.sub(" ", (text or "").lower()).split()
+    return " ".join(w for w in words if w not in RAIL_WORDS)
+
+
+def vocabulary(conn) -> tuple:
+    """Distinct merchant words, reloaded when the data version moves."""
+    global _vocabulary
+    version, _ = current_data_version(conn)
+    if _vocabulary[0] != version:
+        with _vocabulary_lock:
+            if _vocabulary[0] != version:
+                rows = conn.execute(
+                    "SELECT DISTINCT merchant FROM transactions WHERE merchant <> ''"
+                ).fetchall()
+                _vocabulary = (version, tuple(sorted({w for (m,) in rows for w in m.split()})))
+                _incr("vocabulary_loads")
+    return _vocabulary[1]
+
+
+def _tsquery(alternatives) -> str:
+    # words are [a-z]+ after normalization, so nothing here needs escaping
+    return " & ".join("(" + " | ".join(f"{w}:*" for w in alts) + ")" for alts in alternatives)
+
+
+def _fuzzy(words, vocab):
+    alternatives = []
+    for w in words:
+        close = difflib.get_close_matches(w, vocab, n=FUZZY_ALTERNATIVES, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return None
+        alternatives.append(close)
+    return alternatives
+
+
+def _filters(start, end, category):
+    sql, params = [MATCH_SQL], {}
+    if start:
+        sql.append("date >= %(start)s")
+        params["start"] = start
+    if end:
+        sql.append("date <= %(end)s")
+        params["end"] = end
+    if category:
+        sql.append("category_norm = lower(%(category)s)")
+        params["category"] = category
+    return " AND ".join(sql), params
+
+
+def _run(conn, tsquery, where, params, page, page_size):
+    params = dict(params, q=tsquery, limit=page_size, offset=(page - 1) * page_size)
+    merchants = conn.execute(f"""
+        SELECT merchant, count(*), coalesce(sum(abs(amount)), 0)::float8, max(date),
+               ts_rank(to_tsvector('simple', merchant), to_tsquery('simple', %(q)s)) AS rank
+        FROM transactions
+        WHERE {where}
+        GROUP BY merchant
+        ORDER BY rank DESC, count(*) DESC
+    """, params).fetchall()
+    if not merchants:
+        return merchants, []
+    rows = conn.execute(f"""
+        SELECT id, date, amount::float8, category, description
+        FROM transactions
+        WHERE {where}
+        ORDER BY date DESC NULLS LAST, id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    """, params).fetchall()
+    return merchants, rows
+
+
+def search_transactions(query: str, page: int = 1, page_size: int = 20,
+                        start: date = None, end: date = None, category: str = None) -> dict:
+    """Transactions whose merchant matches `query`, with per-merchant totals."""
+    words = normalize_merchant(query).split()
+    if not words:
+        raise ValueError("search needs at least one letter")
+    page = max(1, int(page))
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    where, params = _filters(start, end, category)
+
+    _incr("searches")
+    with connection() as conn, metrics.timed("financebot_sql_duration_seconds", source="search"):
+        terms = [[w] for w in words]
+        merchants, rows = _run(conn, _tsquery(terms), where, params, page, page_size)
+        fuzzy = False
+        if not merchants:
+            terms = _fuzzy(words, vocabulary(conn))
+            if terms:
+                fuzzy = True
+                _incr("fuzzy")
+                merchants, rows = _run(conn, _tsquery(terms), where, params, page, page_size)
+    if not merchants:
+        _incr("no_match")
+
+    matches = sum(m[1] for m in merchants)
+    return {
+        "query": query,
+        "terms": [" | ".join(alts) for alts in terms] if terms else [],
+        "fuzzy": fuzzy,
+        "matches": matches,
+        "total_amount": round(sum(m[2] for m in merchants), 2),
+        "merchants": [{"merchant": m[0], "count": m[1], "total": round(m[2], 2),
+                       "last": m[3].isoformat() if m[3] else None} for m in merchants[:MAX_MERCHANTS]],
+        "more_merchants": max(0, len(merchants) - MAX_MERCHANTS),
+        "page": page,
+        "pages": (matches + page_size - 1) // page_size,
+        "transactions": [{"id": r[0], "date": r[1].isoformat() if r[1] else None, "amount": r[2],
+                          "category": r[3], "description": r[4]} for r in rows],
+    }
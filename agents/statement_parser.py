@@ -0,0 +1,307 @@
+import json
+import os
+import re
+import sys
+import time
+
+from agents.ingest import coerce_transaction, copy_transactions, iter_file, parse_amount, take_option
+from agents.pdf_extract import extract_pdf_pages
+
+
+# Deterministic bank statement -> transactions pipeline:
+#   page text (cached, see pdf_extract) -> regex line parser
+#   pages with lines the regex can't read -> pdfplumber table extraction
+#   -> normalised rows with rule-based categories -> COPY bulk load
+# Lines that look like transactions but can't be parsed either way are
+# returned, so only those need to go through the LLM.
+
+DATE_RE = r"(?:\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}[ -][A-Za-z]{3}[ -]\d{2,4})"
+AMOUNT_RE = r"\(?-?[\d,]+\.\d{2}\)?"
+
+LINE_RE = re.compile(
+    rf"^\s*(?P<date>{DATE_RE})\s+(?P<desc>.*?)\s+(?P<amount>{AMOUNT_RE})\s*(?P<drcr>Dr|Cr)?\.?"
+    rf"(?:\s+(?P<balance>{AMOUNT_RE})\s*(?:Dr|Cr)?\.?)?\s*$",
+    re.IGNORECASE,
+)
+STARTS_WITH_DATE = re.compile(rf"^\s*{DATE_RE}\b")
+LEADING_DATE = re.compile(rf"^{DATE_RE}\s+")
+
+# (pattern, category), first match wins. CATEGORY_RULES_FILE can point at a
+# JSON list of [pattern, category] pairs that are tried before these. A credit
+# only takes a CREDIT_CATEGORIES match (a refund from Amazon is not Shopping
+# spend) and is otherwise "Money Received"; a debit never takes an income one.
+CATEGORY_RULES = [
+    (r"\bsalary\b|payroll", "Salary"),
+    (r"refund|cashback|reversal", "Refund"),
+    (r"\bself\b|own account|to self", "Self Transfer"),
+    (r"grocer|bigbasket|blinkit|zepto|dmart|reliance fresh", "Groceries"),
+    (r"swiggy|zomato|restaurant|cafe|dominos|mcdonald|\bfood\b", "Food"),
+    (r"uber|\bola\b|rapido|metro|irctc|fuel|petrol|hpcl|bpcl|indian oil", "Transport"),
+    (r"amazon|flipkart|myntra|ajio", "Shopping"),
+    (r"netflix|spotify|prime video|hotstar|bookmyshow", "Entertainment"),
+    (r"electricity|broadband|airtel|\bjio\b|vodafone|gas bill|water bill", "Utilities"),
+    (r"\brent\b|maintenance", "Housing"),
+    (r"pharma|hospital|apollo|medical|clinic", "Healthcare"),
+    (r"\batm\b|cash withdrawal", "Cash"),
+]
+INCOME_CATEGORIES = {"Salary", "Refund"}
+CREDIT_CATEGORIES = INCOME_CATEGORIES | {"Self Transfer"}
+# Dated rows that aren't transactions: (pattern on the description, whether
+# the row's amount is a balance). Balance rows still seed the running balance
+# used to sign the next transaction; totals are just skipped.
+SUMMARY_RULES = [
+    (r"\b(opening|closing)\s+bal(ance)?\b", True),
+    (r"\bbal(ance)?\s+(b/f|c/f|brought forward|carried forward|forward)\b", True),
+    (r"^(b/f|c/f|brought forward|carried forward)\b", True),
+    (r"^(grand\s+)?totals?\b", False),
+]
+_SUMMARY_RULES = [(re.compile(p, re.IGNORECASE), is_balance) for p, is_balance in SUMMARY_RULES]
+
+CREDIT_HINTS = re.compile(r"salary|refund|cashback|received|\bcr\b|credit|deposit|interest", re.IGNORECASE)
+
+TABLE_HEADERS = {
+    "date": ("date", "txn date", "transaction date", "value date", "tran date"),
+    "description": ("description", "narration", "particulars", "details", "remarks", "transaction details"),
+    "amount": ("amount", "txn amount", "transaction amount"),
+    "debit": ("debit", "withdrawal", "withdrawals", "dr", "withdrawal amt", "debit amount"),
+    "credit": ("credit", "deposit", "deposits", "cr", "deposit amt", "credit amount"),
+    "balance": ("balance", "closing balance", "running balance"),
+}
+
+MAX_UNPARSED = 200
+
+_compiled_rules = None
+
+
+def category_rules():
+    global _compiled_rules
+    if _compiled_rules is None:
+        rules = []
+        path = os.getenv("CATEGORY_RULES_FILE")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                rules.extend((p, c) for p, c in json.load(f))
+        rules.extend(CATEGORY_RULES)
+        _compiled_rules = [(re.compile(p, re.IGNORECASE), c) for p, c in rules]
+    return _compiled_rules
+
+
+def categorize(description: str, amount) -> str:
+    credit = amount > 0
+    for pattern, category in category_rules():
+        if credit and category not in CREDIT_CATEGORIES:
+            continue
+        if not credit and category in INCOME_CATEGORIES:
+            continue
+        if pattern.search(description or ""):
+            return category
+    return "Money Received" if credit else "Other"
+
+
+def summary_line(description: str):
+    """None for a transaction, else whether the summary row carries a balance."""
+    description = LEADING_DATE.sub("", description or "").strip()
+    for pattern, is_balance in _SUMMARY_RULES:
+        if pattern.search(description):
+            return is_balance
+    return None
+
+
+def _row(date, description, amount):
+    description = LEADING_DATE.sub("", description or "").strip()
+    return {"date": date, "description": description, "amount": amount,
+            "category": categorize(description, amount)}
+
+
+class _LineParser:
+    """Regex parser for one statement; tracks the running balance to sign amounts.
+
+    parse() returns a row, SKIP for a balance or total line, or None when the
+    line isn't a transaction it can read.
+    """
+
+    SKIP = object()
+
+    def __init__(self):
+        self.prev_balance = None
+
+    def parse(self, line):
+        m = LINE_RE.match(line)
+        if not m:
+            return self.SKIP if summary_line(line) is not None else None
+        is_balance = summary_line(m["desc"])
+        if is_balance is not None:
+            if is_balance:
+                balance = parse_amount(m["balance"] or m["amount"])
+                if not m["balance"] and (m["drcr"] or "").lower() == "dr":
+                    balance = -abs(balance)
+                self.prev_balance = balance
+            return self.SKIP
+        amount = abs(parse_amount(m["amount"]))
+        balance = parse_amount(m["balance"]) if m["balance"] else None
+        drcr = (m["drcr"] or "").lower()
+        if drcr:
+            credit = drcr == "cr"
+        elif balance is not None and self.prev_balance is not None and abs(balance - self.prev_balance) == amount:
+            credit = balance > self.prev_balance
+        else:
+            credit = bool(CREDIT_HINTS.search(m["desc"]))
+        if balance is not None:
+            self.prev_balance = balance
+        return _row(m["date"], m["desc"], amount if credit else -amount)
+
+
+def _header_map(row):
+    cells = [(c or "").strip().lower() for c in row]
+    mapping = {}
+    for key, names in TABLE_HEADERS.items():
+        for i, cell in enumerate(cells):
+            if cell in names and key not in mapping and i not in mapping.values():
+                mapping[key] = i
+    if "date" in mapping and ("amount" in mapping or "debit" in mapping or "credit" in mapping):
+        return mapping
+    return None
+
+
+def _cell(row, mapping, key):
+    i = mapping.get(key)
+    return (row[i] or "").strip() if i is not None and i < len(row) else ""
+
+
+def parse_table_rows(tables):
+    """Yield rows from pdfplumber tables whose header names the columns."""
+    for table in tables:
+        mapping = None
+        for row in table:
+            if mapping is None:
+                mapping = _header_map(row)
+                continue
+            date, debit, credit = (_cell(row, mapping, k) for k in ("date", "debit", "credit"))
+            if not STARTS_WITH_DATE.match(date) or summary_line(_cell(row, mapping, "description")) is not None:
+                continue
+            try:
+                if debit:
+                    amount = -abs(parse_amount(debit))
+                elif credit:
+                    amount = abs(parse_amount(credit))
+                else:
+                    amount = parse_amount(_cell(row, mapping, "amount"))
+            except ValueError:
+                continue
+            yield _row(date, " ".join(_cell(row, mapping, "description").split()), amount)
+
+
+def parse_statement(path: str, unparsed: list):
+    """Yield transaction dicts from a statement (.pdf, .txt or .csv).
+
+    Lines that start with a date but could not be parsed are appended to
+    `unparsed` for the caller to hand to the LLM.
+    """
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        for t in iter_file(path):
+            t = {k.lower().strip(): v for k, v in t.items() if k}
+            if "category" not in t or not t["category"]:
+                try:
+                    t["category"] = categorize(t.get("description", ""), parse_amount(t.get("amount", "0")))
+                except ValueError:
+                    pass
+            yield t
+        return
+
+    if lower.endswith(".pdf"):
+        pages = extract_pdf_pages(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            pages = [f.read()]
+
+    parser = _LineParser()
+    for page_no, text in enumerate(pages):
+        rows, misses = [], []
+        for line in text.splitlines():
+            row = parser.parse(line)
+            if row is parser.SKIP:
+                continue
+            if row is not None:
+                rows.append(row)
+            elif STARTS_WITH_DATE.match(line):
+                misses.append(line.strip())
+
+        if misses and lower.endswith(".pdf"):
+            # the text layout defeated the regex; try the page's ruled tables
+            import pdfplumber
+            with pdfplumber.open(path, pages=[page_no + 1]) as pdf:
+                table_rows = list(parse_table_rows(pdf.pages[0].extract_tables()))
+            if len(table_rows) >= len(rows) + len(misses):
+                rows, misses = table_rows, []
+
+        yield from rows
+        for line in misses:
+            unparsed.append(line)
+
+
+def ingest_statement(path: str, dry_run: bool = False, source: str = None) -> dict:
+    """Parse one statement and bulk load its transactions.
+
+    `source` names the account the statement belongs to; see copy_transactions.
+    """
+    unparsed = []
+    start = time.perf_counter()
+    rows = parse_statement(path, unparsed)
+    if dry_run:
+        parsed, rejected = 0, 0
+        for t in rows:
+            try:
+                coerce_transaction(t, source)
+                parsed += 1
+            except (ValueError, TypeError):
+                rejected += 1
+        report = {"inserted": 0, "skipped": 0, "skipped_rows": [], "parsed": parsed, "rejected": rejected}
+    else:
+        report = copy_transactions(rows, source=source)
+        report["parsed"] = report.pop("accepted") + report["rejected"]
+    report.pop("errors", None)
+    elapsed = time.perf_counter() - start
+    report.update({
+        "file": path,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(report["parsed"] / elapsed, 1) if elapsed > 0 else 0.0,
+        "unparsed_count": len(unparsed),
+        "unparsed": unparsed[:MAX_UNPARSED],
+    })
+    return report
+
+
+def statement_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith((".pdf", ".txt", ".csv")):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    args = list(argv if argv is not None else sys.argv[1:])
+    source = take_option(args, "--source")
+    dry_run = "--dry-run" in args
+    paths = [a for a in args if a != "--dry-run"]
+    if not paths:
+        print("usage: python -m agents.statement_parser [--dry-run] [--source ACCOUNT] DIR_OR_FILE [...]")
+        return 2
+    for path in statement_files(paths):
+        r = ingest_statement(path, dry_run=dry_run, source=source)
+        print(f"{path}: parsed {r['parsed']}, inserted {r['inserted']}, skipped {r['skipped']}, "
+              f"rejected {r['rejected']}, unparsed {r['unparsed_count']} in {r['seconds']}s "
+              f"({r['rows_per_sec']} rows/sec)")
+        for line in r["unparsed"][:10]:
+            print("  ? " + line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
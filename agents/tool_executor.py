@@ -0,0 +1,207 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor, get_config_list
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+
+from agents import metrics
+
+
+# Runs the tool calls of one model message concurrently on a shared, bounded
+# thread pool instead of one after another. Results are returned in the order
+# the model issued the calls, whatever order they finish in. Each tool has a
+# concurrency limit (so three PDF parses or SQL queries can't take every
+# worker or pool connection) and a timeout; a call that runs past its timeout
+# is answered with an error ToolMessage and the step moves on. The timeout is
+# counted from the start of the step, so time spent queued counts too.
+#
+# A thread can't be cancelled: a call that times out keeps its worker and its
+# tool's slot until it returns. So every tool that does I/O bounds it itself,
+# below its limit here (HTTP timeouts in common_tools, statement_timeout for
+# SQL); a call still waiting for a slot at its deadline gives up instead of
+# holding a worker; and the pool defaults to the sum of the per-tool limits,
+# so one tool stuck at its limit can't starve the others.
+#
+# The async path (AsyncChatbotAgent under asgi.py) only awaits tools that have
+# a coroutine. The SQL, ingest and PDF tools are sync and use the sync
+# connection pool, so there they are handed to this same thread pool under
+# the same process-wide limits rather than to the event loop's default
+# executor. Under ASGI a chat turn waiting on the LLM holds no thread, but one
+# running a tool still does, and the database tools' limits together (8) must
+# stay below DB_POOL_MAX_SIZE.
+
+# ToolExecutor overrides ToolNode's private step methods (_func, _afunc) and
+# calls its helpers (_parse_input, _run_one, _arun_one, _combine_tool_outputs),
+# which are not a stable API: requirements.txt pins langgraph-prebuilt, and
+# tests/test_tool_executor.py fails if an upgrade changes them.
+
+# name -> (timeout seconds, max concurrent calls across the process)
+TOOL_LIMITS = {
+    "text_parser_tool": (120, 2),
+    "ingest_statement_tool": (300, 2),
+    "insert_large_number_of_transactions": (300, 2),
+    "run_sql_query_tool": (30, 4),
+    "google_search_tool": (20, 4),
+    "local_llm_tool": (40, 1),
+}
+
+NODE_METRIC = "financebot_graph_node_duration_seconds"
+TOOL_METRIC = "financebot_tool_duration_seconds"
+TOOL_ERRORS_METRIC = "financebot_tool_errors_total"
+
+_executor = None
+_executor_lock = threading.Lock()
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _max_workers() -> int:
+    default = sum(limit for _, limit in TOOL_LIMITS.values())
+    return int(os.getenv("TOOL_MAX_WORKERS", str(default)))
+
+
+def _default_timeout() -> float:
+    return float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+
+
+def _default_concurrency() -> int:
+    return int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+
+
+def tool_limits(name: str):
+    """(timeout seconds, max concurrent calls) for the tool called `name`."""
+    return TOOL_LIMITS.get(name, (_default_timeout(), _default_concurrency()))
+
+
+def _record(name, key, seconds=0.0):
+    if key == "calls":
+        metrics.observe(TOOL_METRIC, seconds, tool=name)
+    else:
+        metrics.incr(TOOL_ERRORS_METRIC, tool=name, reason="timeout")
+
+
+def _check_error(name, output):
+    # ToolNode turns exceptions into ToolMessages with status="error"
+    if getattr(output, "status", None) == "error":
+        metrics.incr(TOOL_ERRORS_METRIC, tool=name, reason="exception")
+    return output
+
+
+def tool_stats() -> dict:
+    """Calls, timeouts and total seconds per tool, read back from the metrics."""
+    calls = metrics.histogram_totals(TOOL_METRIC, "tool")
+    timeouts = metrics.counts(TOOL_ERRORS_METRIC, label="tool", reason="timeout")
+    return {name: {"calls": calls.get(name, (0, 0.0))[0], "timeouts": timeouts.get(name, 0),
+                   "seconds": round(calls.get(name, (0, 0.0))[1], 3)}
+            for name in sorted(set(calls) | set(timeouts))}
+
+
+def _get_executor():
+    # ContextThreadPoolExecutor carries the run's contextvars (callbacks,
+    # streaming) into the worker threads, as ToolNode's own executor does
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ContextThreadPoolExecutor(max_workers=_max_workers(), thread_name_prefix="tool")
+    return _executor
+
+
+def _semaphore(name):
+    with _semaphores_lock:
+        if name not in _semaphores:
+            _semaphores[name] = threading.BoundedSemaphore(tool_limits(name)[1])
+        return _semaphores[name]
+
+
+def _timeout_message(call, timeout):
+    return ToolMessage(
+        content=f"Error: {call['name']} did not finish within {timeout:g}s. Try a smaller request.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+class ToolExecutor(ToolNode):
+    """ToolNode that runs a step's tool calls in parallel with per-tool limits."""
+
+    def __init__(self, tools, **kwargs):
+        super().__init__(tools, **kwargs)
+        self._async_semaphores = {}
+
+    def _run_limited(self, call, input_type, config, deadline):
+        start = time.perf_counter()
+        semaphore = _semaphore(call["name"])
+        # past the deadline the step answers with a timeout anyway; free the worker
+        if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise TimeoutError(call["name"])
+        try:
+            return _check_error(call["name"], self._run_one(call, input_type, config))
+        finally:
+            semaphore.release()
+            _record(call["name"], "calls", time.perf_counter() - start)
+
+    def _func(self, input, config: RunnableConfig, *, store: Optional[BaseStore]):
+        with metrics.timed(NODE_METRIC, node=self.name):
+            return self._run_step(input, config, store)
+
+    def _run_step(self, input, config, store):
+        tool_calls, input_type = self._parse_input(input, store)
+        config_list = get_config_list(config, len(tool_calls))
+        executor = _get_executor()
+        step_start = time.monotonic()
+        futures = [executor.submit(self._run_limited, call, input_type, cfg,
+                                   step_start + tool_limits(call["name"])[0])
+                   for call, cfg in zip(tool_calls, config_list)]
+        outputs = []
+        for call, future in zip(tool_calls, futures):
+            timeout = tool_limits(call["name"])[0]
+            try:
+                outputs.append(future.result(timeout=max(0.0, step_start + timeout - time.monotonic())))
+            except TimeoutError:
+                _record(call["name"], "timeouts")
+                outputs.append(_timeout_message(call, timeout))
+        return self._combine_tool_outputs(outputs, input_type)
+
+    async def _arun_in_executor(self, call, input_type, config, timeout):
+        future = _get_executor().submit(self._run_limited, call, input_type, config,
+                                        time.monotonic() + timeout)
+        try:
+            # a call not yet started is cancelled with the wait and never runs
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except TimeoutError:
+            _record(call["name"], "timeouts")
+            return _timeout_message(call, timeout)
+
+    async def _arun_limited(self, call, input_type, config):
+        name = call["name"]
+        timeout, limit = tool_limits(name)
+        if getattr(self.tools_by_name.get(name), "coroutine", None) is None:
+            return await self._arun_in_executor(call, input_type, config, timeout)
+        # asyncio primitives belong to one loop, so these are per agent, not global
+        semaphore = self._async_semaphores.setdefault(name, asyncio.Semaphore(limit))
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                async with semaphore:
+                    return _check_error(name, await self._arun_one(call, input_type, config))
+        except TimeoutError:
+            _record(name, "timeouts")
+            return _timeout_message(call, timeout)
+        finally:
+            _record(name, "calls", time.perf_counter() - start)
+
+    async def _afunc(self, input, config: RunnableConfig, *, store: Optional[BaseStore]):
+        with metrics.timed(NODE_METRIC, node=self.name):
+            tool_calls, input_type = self._parse_input(input, store)
+            outputs = await asyncio.gather(
+                *(self._arun_limited(call, input_type, config) for call in tool_calls)
+            )
+            return self._combine_tool_outputs(outputs, input_type)
@@ -1,50 +1,64 @@
-from flask import Flask, request, jsonify, render_template_string
-from agents.common_tools import tools
-from agents.database_agent import sql_tools
-from agents.chatbot import ChatbotAgent
+from flask import Flask, Response, g, request, jsonify, render_template_string, stream_with_context
+from cachetools import LRUCache
+from agents.cache_dir import cache_stats
+from agents.db import EVENTS as POOL_EVENTS, connection, pool_stats
+from agents.data_version import current_data_version
+from agents.memo import memo_stats
+from agents import metrics
+from agents.profiler import SamplingProfiler, profiling_enabled
+from agents.query_engine import query_stats
+from agents.search import search_stats, search_transactions
 from dotenv import load_dotenv
 import os
-import psycopg2
-from psycopg2 import OperationalError, InterfaceError, DatabaseError
 import calendar
 import random
 import datetime
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
 
 load_dotenv()
 
 app = Flask(__name__)
 
 # --- Database connection ---
-DB_URL = os.getenv("DATABASE_URL")  
-
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        return conn, cur
-    except Exception as e:
-        print("Database connection failed:", e)
-        return None, None
-
-conn, cur = get_db_connection()
-
-if conn and cur:
-    try:
-        # Ensure table exists
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-        """)
-        conn.commit()
-    except Exception as e:
-        print("Error ensuring users table exists:", e)
-else:
-    print("Warning: Database is not connected. App will not function properly.")
-
-my_chatbot = ChatbotAgent(name="FinanceBot", tools=tools + sql_tools)
+# Connections come from the shared pool in agents/db.py and are checked out
+# per request, so gunicorn threads never share a cursor. Tables and indexes
+# are created by `python -m agents.migrations` at deploy time, not on import.
+
+# --- Chatbot ---
+# Nothing here touches the network or the database at import: the agent (LLM
+# client, checkpointer, store, and the pool behind them) is built by the first
+# request that needs it, in the process that serves it. Importing the agent
+# stack is deferred too; see gunicorn.conf.py for preloading it in the master.
+my_chatbot = None
+_chatbot_lock = threading.Lock()
+
+
+def warm_imports():
+    """Import the agent stack without creating clients or connections."""
+    import agents.chatbot
+    import agents.common_tools
+    import agents.analytics
+    import agents.database_agent
+    import agents.forecast
+    import langchain_google_genai
+
+
+def get_chatbot():
+    global my_chatbot
+    if my_chatbot is None or my_chatbot.pid != os.getpid():
+        with _chatbot_lock:
+            if my_chatbot is None or my_chatbot.pid != os.getpid():
+                from agents.chatbot import ChatbotAgent
+                from agents.common_tools import tools
+                from agents.database_agent import sql_tools
+                my_chatbot = ChatbotAgent(name="FinanceBot", tools=tools + sql_tools)
+    return my_chatbot
 
 
 # --- HTML Templates ---
@@ -148,6 +162,12 @@ CHAT_PAGE = """
         const input = document.getElementById('question');
         const themeBtn = document.getElementById('theme-btn');
         let darkMode = true;
+        // one conversation per browser; the server keeps its history by this id
+        let sessionId = localStorage.getItem('financebot_session');
+        if (!sessionId) {
+            sessionId = crypto.randomUUID();
+            localStorage.setItem('financebot_session', sessionId);
+        }
         function appendMessage(text, sender) {
             const msg = document.createElement('div');
             msg.classList.add('message', sender);
@@ -161,14 +181,52 @@ CHAT_PAGE = """
             appendMessage(question, 'user');
             input.value = '';
             appendMessage('Typing...', 'bot');
-            const response = await fetch('/ask', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({ question })
-            });
-            const data = await response.json();
-            chatBox.lastChild.remove(); // remove "Typing..."
-            appendMessage(data.answer || data.error || "Error", 'bot');
+            const botMsg = chatBox.lastChild;
+            let text = '';
+            try {
+                const response = await fetch('/ask-stream', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({ question, session_id: sessionId })
+                });
+                if (!response.ok || !response.body) {
+                    const data = await response.json();
+                    botMsg.textContent = data.answer || data.error || "Error";
+                    return;
+                }
+                // Server-Sent Events over a POST body: read frames as they arrive
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const frames = buffer.split('\\n\\n');
+                    buffer = frames.pop();
+                    for (const frame of frames) {
+                        const line = frame.split('\\n').find(l => l.startsWith('data: '));
+                        if (!line) continue;
+                        const ev = JSON.parse(line.slice(6));
+                        if (ev.type === 'token') {
+                            text += ev.content;
+                            botMsg.textContent = text;
+                        } else if (ev.type === 'tool_call') {
+                            botMsg.textContent = (text ? text + '\\n' : '') + 'Running ' + ev.name + '...';
+                        } else if (ev.type === 'tool_result') {
+                            text = '';
+                            botMsg.textContent = 'Finished ' + ev.name + ', thinking...';
+                        } else if (ev.type === 'done') {
+                            botMsg.textContent = ev.answer || text || "Error";
+                        } else if (ev.type === 'error') {
+                            botMsg.textContent = ev.error || "Error";
+                        }
+                        chatBox.scrollTop = chatBox.scrollHeight;
+                    }
+                }
+            } catch (err) {
+                botMsg.textContent = "Error: " + err;
+            }
         }
         input.addEventListener('keydown', e => {
             if (e.key === 'Enter') sendMessage();
@@ -300,14 +358,62 @@ CHAT_PAGE = """
 </html>
 """
 
+# --- Chart response cache ---
+# Chart JSON is cached per (path, query args, day, data version). The data
+# version moves on every write to `transactions`, so entries never need
+# explicit invalidation; the ETag is derived from the same key so browsers
+# revalidate with a single version lookup and get a 304. There is no
+# Last-Modified: the key also moves with the day and the query args, which a
+# data timestamp can't express, so If-Modified-Since could wrongly 304. A
+# view that fell back to dummy data sets g.chart_fallback; that response is
+# neither cached nor given an ETag.
+_chart_cache = LRUCache(maxsize=int(os.getenv("CHART_CACHE_SIZE", "256")))
+_chart_cache_lock = threading.Lock()
+CHART_CACHE_METRIC = "financebot_chart_cache_events_total"
+CHART_CACHE_EVENTS = ("hits", "misses", "not_modified")
+
+
+def cached_by_data_version(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version, _ = current_data_version()
+        except Exception as e:
+            # DB unavailable: let the view fall back to its dummy data, uncached
+            print("Chart cache bypassed:", e)
+            return view(*args, **kwargs)
+
+        key = (request.path, tuple(sorted(request.args.items())), datetime.date.today().isoformat(), version)
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+        if request.if_none_match.contains(etag):
+            metrics.incr(CHART_CACHE_METRIC, event="not_modified")
+            response = app.response_class(status=304)
+        else:
+            with _chart_cache_lock:
+                payload = _chart_cache.get(key)
+            metrics.incr(CHART_CACHE_METRIC, event="hits" if payload is not None else "misses")
+            if payload is None:
+                response = view(*args, **kwargs)
+                if g.pop("chart_fallback", False):
+                    response.cache_control.no_store = True
+                    return response
+                payload = response.get_json()
+                with _chart_cache_lock:
+                    _chart_cache[key] = payload
+            response = jsonify(payload)
+
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
 @app.route('/expenses-data')
+@cached_by_data_version
 def expenses_data():
     # Return last-12-month labels and totals by querying `transactions` table.
     try:
-        conn_local, cur_local = ensure_db()
-        if conn_local is None or cur_local is None:
-            raise Exception("DB connection not available")
-
         today = datetime.date.today()
         # compute earliest month start (first day of month 11 months ago)
         months = []
@@ -323,16 +429,17 @@ def expenses_data():
 
         earliest = month_starts[0]
 
-        # Exclude internal transfers (category 'self transfer') from expense totals
+        # Totals come from the (month, category) rollup, which already leaves out
+        # internal transfers, so this reads at most 12 months of rows.
         query = """
-            SELECT date_trunc('month', date) AS month, SUM(ABS(amount)) AS total
-            FROM transactions
-            WHERE date >= %s AND lower(coalesce(category, '')) NOT IN ('self transfer','transfers')
+            SELECT month, SUM(total) AS total
+            FROM expense_rollup
+            WHERE month >= %s AND txn_count > 0
             GROUP BY month
             ORDER BY month
         """
-        cur_local.execute(query, (earliest,))
-        rows = cur_local.fetchall() or []
+        with connection() as conn, metrics.timed("financebot_sql_duration_seconds", source="chart_monthly"):
+            rows = conn.execute(query, (earliest,)).fetchall() or []
 
         totals_by_month = {}
         for r in rows:
@@ -349,6 +456,8 @@ def expenses_data():
 
     except Exception as e:
         # Fallback to dummy data if DB is unavailable or query fails
+        print("Expenses chart query failed:", e)
+        g.chart_fallback = True
         today = datetime.date.today()
         labels = []
         for i in range(11, -1, -1):
@@ -363,6 +472,7 @@ def expenses_data():
 
 
 @app.route('/expenses-category-data')
+@cached_by_data_version
 def expenses_category_data():
     # Return category-wise totals for the selected month by querying `transactions` table.
     label = request.args.get('label', '')
@@ -379,27 +489,16 @@ def expenses_category_data():
             today = datetime.date.today()
             start_dt = datetime.date(today.year, today.month, 1)
 
-        # compute next month start
-        if start_dt.month == 12:
-            end_dt = datetime.date(start_dt.year + 1, 1, 1)
-        else:
-            end_dt = datetime.date(start_dt.year, start_dt.month + 1, 1)
-
-        conn_local, cur_local = ensure_db()
-        if conn_local is None or cur_local is None:
-            raise Exception("DB connection not available")
-
-        # Exclude internal transfers and return top 5 categories by total
+        # Top 5 categories by total from the rollup (transfers already excluded)
         query = """
-            SELECT category, SUM(ABS(amount))::float AS total
-            FROM transactions
-            WHERE date >= %s AND date < %s AND lower(coalesce(category, '')) NOT IN ('self-transfer','transfers' ,'money received')
-            GROUP BY category
+            SELECT NULLIF(category, ''), total::float AS total
+            FROM expense_rollup
+            WHERE month = %s AND txn_count > 0
             ORDER BY total DESC
             LIMIT 5
         """
-        cur_local.execute(query, (start_dt, end_dt))
-        rows = cur_local.fetchall() or []
+        with connection() as conn, metrics.timed("financebot_sql_duration_seconds", source="chart_category"):
+            rows = conn.execute(query, (start_dt,)).fetchall() or []
 
         if rows:
             labels = [r[0] for r in rows]
@@ -411,6 +510,8 @@ def expenses_category_data():
 
     except Exception as e:
         # fallback to previous dummy behavior
+        print("Category chart query failed:", e)
+        g.chart_fallback = True
         categories = ['Housing', 'Food', 'Transport', 'Utilities', 'Entertainment', 'Healthcare', 'Other']
         seed = sum(ord(c) for c in label) if label else None
         if seed:
@@ -418,6 +519,105 @@ def expenses_category_data():
         values = [random.randint(50, 1200) for _ in categories]
         return jsonify({"labels": categories, "values": values})
 
+
+@app.route('/forecast-data')
+def forecast_data():
+    # Stored forecasts only: fitting happens in agents/forecast.py's background
+    # refit thread, which the first request in each worker starts.
+    from agents import forecast
+    category = request.args.get('category', '')
+    try:
+        forecast.ensure_scheduler()
+        stored = forecast.load_forecasts()
+    except Exception as e:
+        print("Forecast unavailable:", e)
+        return jsonify({"error": "forecast unavailable"}), 503
+
+    categories = [f["name"] for f in stored if f["kind"] == "category"]
+    kind = "category" if category else "total"
+    series = next((f for f in stored if f["kind"] == kind and f["name"] == category), None)
+    if series is None:
+        if not stored:
+            forecast.request_refit()
+        return jsonify({"labels": [], "history": [], "forecast": [], "lower": [], "upper": [],
+                        "categories": categories, "pending": not stored})
+
+    def label(month):
+        return datetime.date.fromisoformat(month).strftime('%b %Y')
+
+    history = series["history"][-12:]
+    ahead = series["forecast"]
+    trained_through = series["trained_through"]
+    last_complete = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+    return jsonify({
+        "labels": [label(m) for m, _ in history] + [label(m) for m, *_ in ahead],
+        "history": [v for _, v in history] + [None] * len(ahead),
+        "forecast": [None] * len(history) + [p[1] for p in ahead],
+        "lower": [None] * len(history) + [p[2] for p in ahead],
+        "upper": [None] * len(history) + [p[3] for p in ahead],
+        "categories": categories,
+        "fitted_at": series["fitted_at"].isoformat(),
+        "trained_through": trained_through.isoformat(),
+        # a month has completed since the fit and the refit hasn't run yet
+        "stale": trained_through < last_complete,
+    })
+
+
+@app.route('/search')
+def search():
+    # Merchant/description search; see agents/search.py
+    try:
+        start = datetime.date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        end = datetime.date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        result = search_transactions(request.args.get("q", ""), request.args.get("page", 1, type=int),
+                                     request.args.get("page_size", 20, type=int), start, end,
+                                     request.args.get("category") or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Search failed:", e)
+        return jsonify({"error": "search unavailable"}), 503
+    return jsonify(result)
+
+
+# --- Analytics ---
+# JSON views of agents/analytics.py. Results are already memoized per data
+# version there; unlike the charts there is no dummy fallback, so a failure
+# is a 503 rather than made-up numbers.
+
+def _analytics_response(name, *args):
+    from agents import analytics
+    try:
+        return jsonify(getattr(analytics, name)(*args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Analytics failed:", e)
+        return jsonify({"error": "analytics unavailable"}), 503
+
+
+@app.route('/analytics/monthly')
+def analytics_monthly():
+    return _analytics_response("monthly_summary", request.args.get("months", 12, type=int))
+
+
+@app.route('/analytics/categories')
+def analytics_categories():
+    return _analytics_response("category_breakdown", request.args.get("month") or None,
+                               request.args.get("months", 1, type=int), request.args.get("top", 10, type=int))
+
+
+@app.route('/analytics/recurring')
+def analytics_recurring():
+    return _analytics_response("recurring_payments", request.args.get("min_occurrences", 3, type=int),
+                               request.args.get("limit", 25, type=int))
+
+
+@app.route('/analytics/anomalies')
+def analytics_anomalies():
+    return _analytics_response("spending_anomalies", request.args.get("days", 90, type=int),
+                               request.args.get("threshold", 3.5, type=float), request.args.get("limit", 20, type=int))
+
 SIGNUP_PAGE = """
 <!DOCTYPE html>
 <html>
@@ -448,18 +648,6 @@ SIGNUP_PAGE = """
 </html>
 """
 
-def ensure_db():
-    global conn, cur
-    try:
-        if conn is None or cur is None or conn.closed != 0:
-            conn, cur = get_db_connection()
-        else:
-            # Test connection
-            cur.execute("SELECT 1;")
-    except (OperationalError, InterfaceError, DatabaseError):
-        conn, cur = get_db_connection()
-    return conn, cur
-
 # --- Routes ---
 @app.route("/signup", methods=["GET", "POST"])
 def signup():
@@ -477,17 +665,121 @@ def logout():
 def home():
     return render_template_string(CHAT_PAGE)
 
+@app.route("/stats")
+def stats():
+    from agents.analytics import analytics_stats
+    from agents.chatbot import context_stats
+    from agents.database_agent import sql_cache_stats
+    from agents.forecast import forecast_stats
+    from agents.tool_executor import tool_stats
+    with _chart_cache_lock:
+        size = len(_chart_cache)
+    chart_cache = dict(metrics.counts(CHART_CACHE_METRIC, CHART_CACHE_EVENTS), size=size)
+    return jsonify({"db_pool": pool_stats(), "chart_cache": chart_cache, "context": context_stats(),
+                    "scratch_cache": cache_stats(), "sql": query_stats(),
+                    "sql_cache": sql_cache_stats(), "tools": tool_stats(),
+                    "tool_memo": memo_stats(), "analytics": analytics_stats(),
+                    "forecast": forecast_stats(),
+                    "search": search_stats()})
+
+# --- Metrics and profiling ---
+# Every request is timed by route template (not raw path, to keep label
+# cardinality fixed). For streamed responses this is the time to the first
+# byte. With PROFILING_ENABLED=1, a request with ?profile=1 or an
+# "X-Profile: 1" header is sampled and the collapsed stacks are written to
+# PROFILE_DIR; the response names the file in X-Profile-File.
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiling_enabled() and (request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"):
+        g.profiler = SamplingProfiler().start()
+
+
+@app.after_request
+def _record_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.observe("financebot_http_request_duration_seconds", time.perf_counter() - start,
+                        route=_route_label(), method=request.method, status=response.status_code)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        path = profiler.stop().save(request.endpoint or "request")
+        response.headers["X-Profile-File"] = path
+        response.headers["X-Profile-Samples"] = str(profiler.samples)
+    return response
+
+
+@app.teardown_request
+def _record_failed_request(exc):
+    # after_request doesn't run when a view raises
+    start = g.pop("request_start", None)
+    if exc is not None and start is not None:
+        metrics.observe("financebot_http_request_duration_seconds", time.perf_counter() - start,
+                        route=_route_label(), method=request.method, status=500)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # checkouts and health checks are already counters (financebot_db_pool_events_total)
+    pool = {((("stat", k),)): v for k, v in pool_stats().items()
+            if isinstance(v, (int, float)) and k not in POOL_EVENTS}
+    body = metrics.render({"financebot_db_pool": pool})
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def resolve_session_id(data, cookies):
+    # Explicit id in the body wins (API clients), then the cookie; otherwise
+    # start a new conversation.
+    session_id = data.get("session_id") or cookies.get("session_id")
+    if session_id and SESSION_ID_RE.match(str(session_id)):
+        return str(session_id)
+    return uuid.uuid4().hex
+
 @app.route("/ask", methods=["POST"])
 def ask():
     data = request.json
     question = data.get("question", "")
     if not question:
         return jsonify({"error": "No question provided"}), 400
+    session_id = resolve_session_id(data, request.cookies)
     try:
-        answer = my_chatbot.dialogue(question)
-        return jsonify({"answer": answer})
+        answer = get_chatbot().dialogue(question, thread_id=session_id)
+        response = jsonify({"answer": answer, "session_id": session_id})
+        response.set_cookie("session_id", session_id, httponly=True, samesite="Lax")
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/ask-stream", methods=["POST"])
+def ask_stream():
+    # Same as /ask, but sends tokens and tool progress as Server-Sent Events.
+    data = request.json
+    question = data.get("question", "")
+    if not question:
+        return jsonify({"error": "No question provided"}), 400
+    session_id = resolve_session_id(data, request.cookies)
+
+    def events():
+        try:
+            for event in get_chatbot().stream_dialogue(question, thread_id=session_id):
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.set_cookie("session_id", session_id, httponly=True, samesite="Lax")
+    return response
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""ASGI entry point: async chat routes, everything else from the Flask app.
+
+    WEB_CONCURRENCY=2 gunicorn asgi:app -k uvicorn_worker.UvicornWorker
+
+/ask and /ask-stream run on AsyncChatbotAgent (ainvoke/astream over the async
+Postgres checkpointer), so a conversation waiting on the LLM holds no thread
+and one process can carry hundreds of them. Every other route is the existing
+Flask app, run in the worker's thread pool.
+"""
+import contextlib
+import json
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, resolve_session_id
+from agents.chatbot import AsyncChatbotAgent
+from agents.common_tools import tools
+from agents.database_agent import sql_tools
+from agents.db import close_async_pool
+
+chatbot = None
+
+
+async def ask(request):
+    data = await request.json()
+    question = data.get("question", "")
+    if not question:
+        return JSONResponse({"error": "No question provided"}, status_code=400)
+    session_id = resolve_session_id(data, request.cookies)
+    try:
+        answer = await chatbot.adialogue(question, thread_id=session_id)
+        response = JSONResponse({"answer": answer, "session_id": session_id})
+        response.set_cookie("session_id", session_id, httponly=True, samesite="lax")
+        return response
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def ask_stream(request):
+    data = await request.json()
+    question = data.get("question", "")
+    if not question:
+        return JSONResponse({"error": "No question provided"}, status_code=400)
+    session_id = resolve_session_id(data, request.cookies)
+
+    async def events():
+        try:
+            async for event in chatbot.astream_dialogue(question, thread_id=session_id):
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.set_cookie("session_id", session_id, httponly=True, samesite="lax")
+    return response
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global chatbot
+    chatbot = await AsyncChatbotAgent(name="FinanceBot", tools=tools + sql_tools).setup()
+    try:
+        yield
+    finally:
+        await close_async_pool()
+
+
+app = Starlette(
+    routes=[
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask-stream", ask_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
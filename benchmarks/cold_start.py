@@ -0,0 +1,152 @@
+"""Cold-start cost of the web app: import time, gunicorn boot, first requests.
+
+    python -m benchmarks.cold_start [--repeat 5] [--workers 2] [--no-preload] [--json]
+
+Each measurement runs in a fresh interpreter:
+  import_app_s      `import app`
+  agent_build_s     app.get_chatbot() after import (LLM client, pool, graph)
+  gunicorn_ready_s  `gunicorn app:app` start until /metrics answers
+  first_chart_s     the first /expenses-data on that server (opens the pool)
+  first_stats_s     the first /stats after that (imports the agent stack
+                    unless the master preloaded it)
+The agent is built with a dummy GOOGLE_API_KEY; nothing calls Gemini.
+DATABASE_URL must point at a migrated database.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import app
+t_import = time.perf_counter() - t
+t = time.perf_counter()
+app.get_chatbot()
+print(t_import, time.perf_counter() - t)
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path, timeout=5):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=_env(),
+                         capture_output=True, text=True, check=True)
+    t_import, t_agent = out.stdout.split()[-2:]
+    return float(t_import), float(t_agent)
+
+
+def measure_gunicorn(workers=2, preload=True, timeout=60):
+    port = _free_port()
+    env = _env()
+    env["GUNICORN_PRELOAD"] = "1" if preload else "0"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}", "-w", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("gunicorn did not become ready")
+            try:
+                if _get(port, "/metrics", timeout=1) == 200:
+                    break
+            except OSError:
+                time.sleep(0.02)
+        ready = time.perf_counter() - start
+        t = time.perf_counter()
+        _get(port, "/expenses-data")
+        first_chart = time.perf_counter() - t
+        t = time.perf_counter()
+        _get(port, "/stats", timeout=30)
+        first_stats = time.perf_counter() - t
+        return ready, first_chart, first_stats
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def run(repeat=5, workers=2, preload=True):
+    imports, agents, ready, chart, stats = [], [], [], [], []
+    for _ in range(repeat):
+        i, a = measure_import()
+        imports.append(i)
+        agents.append(a)
+        r, c, s = measure_gunicorn(workers, preload)
+        ready.append(r)
+        chart.append(c)
+        stats.append(s)
+
+    def med(values):
+        return round(statistics.median(values), 3)
+
+    return {
+        "repeat": repeat,
+        "workers": workers,
+        "preload": preload,
+        "import_app_s": med(imports),
+        "agent_build_s": med(agents),
+        "gunicorn_ready_s": med(ready),
+        "first_chart_s": med(chart),
+        "first_stats_s": med(stats),
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--no-preload", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    result = run(args.repeat, args.workers, not args.no_preload)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for k, v in result.items():
+            print(f"{k:>18}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Per-turn cost of ChatbotAgent.dialogue over a long conversation.
+
+    python -m benchmarks.dialogue_turns [--turns 200] [--postgres] [--mode append|resend] [--json]
+
+Uses the offline FakeChatModel, so the numbers are graph + checkpointer
+overhead only. --mode resend replays the old behaviour of passing the whole
+history back into graph.invoke on every turn, for comparison. --postgres
+checkpoints through DATABASE_URL instead of an in-memory saver.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+
+from agents.chatbot import ChatbotAgent
+from benchmarks.fake_llm import FakeChatModel
+
+
+class _SizedSaver:
+    """Wraps a checkpointer and records the bytes of each checkpoint write."""
+
+    def __init__(self, saver):
+        self._saver = saver
+        self.last_bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._saver, name)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        values = checkpoint.get("channel_values", {})
+        self.last_bytes += sum(
+            len(self._saver.serde.dumps_typed(values[k])[1]) for k in new_versions if k in values
+        )
+        return self._saver.put(config, checkpoint, metadata, new_versions)
+
+
+def run(turns=200, postgres=False, mode="append"):
+    if postgres:
+        from agents.chatbot import PooledPostgresSaver
+        from agents.db import get_pool
+        from langgraph.store.postgres import PostgresStore
+        saver, store = PooledPostgresSaver(get_pool()), PostgresStore(get_pool())
+        saver.setup()
+        store.setup()
+    else:
+        saver, store = MemorySaver(), InMemoryStore()
+
+    # the graph only needs the BaseCheckpointSaver interface; wrap it after compile
+    agent = ChatbotAgent(name="bench", tools=[], llm=FakeChatModel(), checkpointer=saver, store=store)
+    sized = _SizedSaver(saver)
+    agent.graph.checkpointer = sized
+
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex}"}}
+    latencies, sizes = [], []
+    history = []
+    for i in range(turns):
+        question = f"question {i}"
+        sized.last_bytes = 0
+        start = time.perf_counter()
+        if mode == "resend":
+            state = agent.graph.invoke(
+                {"messages": history + [{"role": "user", "content": question}]}, config=config
+            )
+            history = state["messages"]
+        else:
+            agent.dialogue(question, thread_id=config["configurable"]["thread_id"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        sizes.append(sized.last_bytes)
+
+    def window(values, lo, hi):
+        part = values[lo:hi]
+        return round(statistics.median(part), 3) if part else None
+
+    n = len(latencies)
+    w = max(1, n // 10)
+    return {
+        "mode": mode,
+        "backend": "postgres" if postgres else "memory",
+        "turns": n,
+        "turn_ms_median_first": window(latencies, 0, w),
+        "turn_ms_median_middle": window(latencies, n // 2 - w // 2, n // 2 + w - w // 2),
+        "turn_ms_median_last": window(latencies, n - w, n),
+        "checkpoint_bytes_first": sizes[0] if sizes else 0,
+        "checkpoint_bytes_last": sizes[-1] if sizes else 0,
+        "total_s": round(sum(latencies) / 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--postgres", action="store_true")
+    parser.add_argument("--mode", choices=["append", "resend"], default="append")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.postgres:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    result = run(args.turns, args.postgres, args.mode)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for k, v in result.items():
+            print(f"{k:>24}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic, offline stand-in for the Gemini chat model.
+
+    Replies with a fixed text plus the number of user turns seen, optionally
+    after a fixed delay to mimic model latency.
+    """
+
+    reply: str = "ok"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-finance"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _result(self, messages):
+        turns = sum(1 for m in messages if m.type == "human")
+        message = AIMessage(content=f"{self.reply} #{turns}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # awaits like a real network client instead of blocking a thread
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
@@ -0,0 +1,75 @@
+"""Prophet fit time against history length and category count.
+
+    python -m benchmarks.forecast_fit [--months 12,24,48,96] [--categories 1,4,8,16] [--repeat 3] [--json]
+
+Fits the same models the background refit does (agents.forecast.fit_series)
+on synthetic monthly spend series: a trend, a yearly cycle and noise. One
+refit fits the total plus one series per category, so a row's total is
+what a worker spends per refit at that size. No database is needed.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from agents.forecast import fit_series
+
+
+def synthetic_series(months: int, seed: int, end_month: int = 2025 * 12) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    t = np.arange(months)
+    level = rng.uniform(2_000, 50_000)
+    values = level * (1 + 0.01 * t) * (1 + 0.15 * np.sin(2 * np.pi * t / 12)) * rng.lognormal(0, 0.1, months)
+    return pd.Series(values, index=range(end_month - months + 1, end_month + 1))
+
+
+def run(months_list=(12, 24, 48, 96), categories_list=(1, 4, 8, 16), repeat=3):
+    fit_series(synthetic_series(12, 0))  # import prophet and load the Stan model once
+
+    results = []
+    for months in months_list:
+        for categories in categories_list:
+            runs, per_series = [], []
+            for r in range(repeat):
+                series = [synthetic_series(months, seed=r * 1000 + i) for i in range(categories + 1)]
+                start = time.perf_counter()
+                for s in series:
+                    t = time.perf_counter()
+                    fit_series(s)
+                    per_series.append(time.perf_counter() - t)
+                runs.append(time.perf_counter() - start)
+            results.append({
+                "months": months,
+                "categories": categories,
+                "series": categories + 1,
+                "refit_s": round(statistics.median(runs), 3),
+                "per_series_ms": round(statistics.median(per_series) * 1000, 1),
+                "max_series_ms": round(max(per_series) * 1000, 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--months", default="12,24,48,96")
+    parser.add_argument("--categories", default="1,4,8,16")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run([int(m) for m in args.months.split(",")],
+                  [int(c) for c in args.categories.split(",")], args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'months':>6} {'categories':>10} {'series':>6} {'refit_s':>8} {'per_series_ms':>13} {'max_series_ms':>13}")
+    for r in results:
+        print(f"{r['months']:>6} {r['categories']:>10} {r['series']:>6} {r['refit_s']:>8} "
+              f"{r['per_series_ms']:>13} {r['max_series_ms']:>13}")
+
+
+if __name__ == "__main__":
+    main()
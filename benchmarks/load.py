@@ -0,0 +1,236 @@
+"""Offline load test of the Flask app and the agent graph.
+
+    python -m benchmarks.load [--rows 50000] [--reset] [--concurrency 1,4,16]
+                              [--requests 200] [--llm-latency 0.05] [--cold-charts]
+                              [--out results.json] [--compare baseline.json]
+
+Serves app.py on a local port with the chat model replaced by the offline
+FakeChatModel, against the Postgres at DATABASE_URL. With --rows, that many
+synthetic transactions are loaded first (--reset truncates the table; use a
+scratch database). At each concurrency level every endpoint gets --requests
+requests from that many client threads, and `agent.dialogue` is driven
+in-process to isolate per-turn graph latency. --cold-charts adds a unique
+query argument to every chart request so the chart cache never answers.
+
+Prints a table and, with --out, writes the results as JSON. --compare prints
+the change in p95 and throughput against an earlier --out file.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+
+from benchmarks.fake_llm import FakeChatModel
+
+ENDPOINTS = ["/ask", "/expenses-data", "/expenses-category-data", "agent.dialogue"]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _summary(endpoint, concurrency, latencies, errors, wall):
+    n = len(latencies)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": n + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if n else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if n else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if n else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if n else None,
+        "throughput_rps": round(n / wall, 1) if wall else None,
+    }
+
+
+def _drive(worker, concurrency, requests):
+    """Run `worker(i)` `requests` times from `concurrency` threads."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def loop():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok = worker(i)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+class _Client(threading.local):
+    """One keep-alive HTTP connection per client thread."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+
+def _http_worker(client, endpoint, cold, month_label):
+    def worker(i):
+        if endpoint == "/ask":
+            # a handful of sessions, so threads grow and share conversations
+            return client.request("POST", "/ask", {"question": f"how much did I spend? #{i}",
+                                                  "session_id": f"bench{i % 16}"}) == 200
+        path = endpoint
+        if endpoint == "/expenses-category-data":
+            path += f"?label={month_label.replace(' ', '+')}"
+        if cold:
+            path += ("&" if "?" in path else "?") + f"_bench={uuid.uuid4().hex}"
+        return client.request("GET", path) == 200
+    return worker
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(concurrency_levels=(1, 4, 16), requests=200, llm_latency=0.05, cold_charts=False):
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    from werkzeug.serving import make_server
+
+    import app as app_module
+    from agents.chatbot import ChatbotAgent
+    from agents.common_tools import tools
+    from agents.database_agent import sql_tools
+
+    agent = ChatbotAgent(name="bench", tools=tools + sql_tools,
+                         llm=FakeChatModel(reply="You spent a lot.", latency=llm_latency))
+    app_module.my_chatbot = agent
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    client = _Client(port)
+    today = datetime.date.today()
+    month_label = today.strftime("%b %Y")
+
+    results = []
+    try:
+        for concurrency in concurrency_levels:
+            for endpoint in ENDPOINTS:
+                if endpoint == "agent.dialogue":
+                    def worker(i):
+                        agent.dialogue(f"question {i}", thread_id=f"bench-agent{i % 16}")
+                        return True
+                else:
+                    worker = _http_worker(client, endpoint, cold_charts, month_label)
+                latencies, errors, wall = _drive(worker, concurrency, requests)
+                results.append(_summary(endpoint, concurrency, latencies, errors, wall))
+    finally:
+        server.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "requests_per_level": requests,
+            "llm_latency_s": llm_latency,
+            "cold_charts": cold_charts,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline):
+    """Lines describing the change in p95 and throughput against `baseline`."""
+    before = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    lines = []
+    for r in current["results"]:
+        b = before.get((r["endpoint"], r["concurrency"]))
+        if not b or not b["p95_ms"] or not r["p95_ms"]:
+            continue
+        dp95 = (r["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100
+        drps = (r["throughput_rps"] - b["throughput_rps"]) / b["throughput_rps"] * 100
+        lines.append(f"{r['endpoint']:<26} c={r['concurrency']:<3} p95 {b['p95_ms']:>9} -> {r['p95_ms']:>9} ms "
+                     f"({dp95:+.1f}%)  rps {b['throughput_rps']:>8} -> {r['throughput_rps']:>8} ({drps:+.1f}%)")
+    return lines
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=0)
+    parser.add_argument("--reset", action="store_true")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--cold-charts", action="store_true")
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    if args.rows:
+        from benchmarks.synthetic import load
+        report = load(args.rows, reset=args.reset)
+        print(f"Loaded {report['inserted']} synthetic transactions")
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    result = run(levels, args.requests, args.llm_latency, args.cold_charts)
+    result["meta"]["rows_loaded"] = args.rows
+
+    print(f"{'endpoint':<26} {'conc':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8} {'err':>4}")
+    for r in result["results"]:
+        print(f"{r['endpoint']:<26} {r['concurrency']:>4} {r['p50_ms']!s:>9} {r['p95_ms']!s:>9} "
+              f"{r['p99_ms']!s:>9} {r['throughput_rps']!s:>8} {r['errors']:>4}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            for line in compare(result, json.load(f)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
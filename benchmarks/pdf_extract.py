@@ -0,0 +1,90 @@
+"""PDF extraction: old serial double-extract vs single pass, process pool and cache.
+
+    python -m benchmarks.pdf_extract [statement.pdf] [--pages 120] [--workers N] [--json]
+
+With no file, a synthetic statement of --pages pages is generated with
+matplotlib. Each mode runs against a fresh cache directory except "cached",
+which repeats the parallel run against the cache it just filled.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import pdfplumber
+
+
+def make_statement(path, pages, rows_per_page=40):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    rng = random.Random(7)
+    merchants = ["AMAZON", "SWIGGY", "UBER", "RELIANCE FRESH", "NETFLIX", "SALARY", "HDFC ATM", "ZOMATO"]
+    with PdfPages(path) as pdf:
+        for p in range(pages):
+            fig = plt.figure(figsize=(8.27, 11.69))
+            for r in range(rows_per_page):
+                day = 1 + (p * rows_per_page + r) % 28
+                line = f"{day:02d}/{1 + p % 12:02d}/2024  UPI-{rng.choice(merchants)}-{rng.randint(10000, 99999)}  {rng.uniform(5, 5000):>10.2f}"
+                fig.text(0.05, 0.95 - r * 0.022, line, family="monospace", fontsize=8)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def old_serial(path):
+    # what text_parser_tool used to do: extract_text() twice per page
+    with pdfplumber.open(path) as pdf:
+        return [p.extract_text() for p in pdf.pages if p.extract_text()]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return round(time.perf_counter() - start, 3), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", nargs="?")
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="pdfbench_")
+    path = args.pdf
+    if path is None:
+        path = os.path.join(work, "statement.pdf")
+        make_statement(path, args.pages)
+
+    # configure before importing so the module picks up the settings
+    os.environ["PDF_WORKERS"] = str(args.workers)
+    from agents import pdf_extract
+
+    results = {"pdf": path, "workers": args.workers}
+    results["old_serial_s"], pages = timed(lambda: old_serial(path))
+    results["pages"] = len(pages)
+
+    os.environ["PDF_CACHE_DIR"] = os.path.join(work, "single")
+    os.environ["PDF_MIN_PAGES_PER_WORKER"] = str(10 ** 9)
+    results["single_pass_s"], _ = timed(lambda: pdf_extract.extract_pdf_pages(path))
+
+    os.environ["PDF_CACHE_DIR"] = os.path.join(work, "parallel")
+    os.environ["PDF_MIN_PAGES_PER_WORKER"] = "8"
+    results["parallel_s"], _ = timed(lambda: pdf_extract.extract_pdf_pages(path))
+    results["cached_s"], _ = timed(lambda: pdf_extract.extract_pdf_pages(path))
+    results["cache"] = pdf_extract.pdf_cache_stats()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for k, v in results.items():
+            print(f"{k:>14}: {v}")
+
+
+if __name__ == "__main__":
+    main()
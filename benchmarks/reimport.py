@@ -0,0 +1,58 @@
+"""Re-importing statements: duplicate detection cost at scale.
+
+    python -m benchmarks.reimport [--rows 5000] [--months 12] [--json]
+
+Truncates `transactions` in DATABASE_URL (use a scratch database), loads
+--rows synthetic transactions spread over --months months, then loads:
+  reimport   the same rows again: every row is skipped
+  overlap    the last half again plus as many new rows: half are skipped
+and reports inserted/skipped counts, seconds and rows/sec for each pass.
+"""
+import argparse
+import json
+
+
+def run(rows=5_000, months=12):
+    from agents.db import connection
+    from agents.ingest import copy_transactions
+    from benchmarks.synthetic import synthetic_transactions
+
+    with connection() as conn:
+        conn.execute("TRUNCATE transactions RESTART IDENTITY")
+
+    original = list(synthetic_transactions(rows, months, seed=0))
+    fresh = list(synthetic_transactions(rows // 2, months, seed=1))
+    passes = [
+        ("initial", original),
+        ("reimport", original),
+        ("overlap", original[rows // 2:] + fresh),
+    ]
+    results = []
+    for name, batch in passes:
+        report = copy_transactions(batch)
+        results.append({"pass": name, "rows": len(batch), **{k: report[k] for k in
+                        ("inserted", "skipped", "rejected", "seconds", "rows_per_sec")}})
+    return results
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.months)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'pass':<10} {'rows':>8} {'inserted':>9} {'skipped':>9} {'seconds':>8} {'rows/sec':>10}")
+    for r in results:
+        print(f"{r['pass']:<10} {r['rows']:>8} {r['inserted']:>9} {r['skipped']:>9} {r['seconds']:>8} {r['rows_per_sec']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Merchant search latency against the ILIKE queries it replaces.
+
+    python -m benchmarks.search [--rows 1000000] [--reset] [--repeat 20] [--json]
+
+With --rows, that many synthetic transactions are loaded into DATABASE_URL
+first (--reset truncates the table; use a scratch database) and the table is
+analyzed. Each case runs agents.search.search_transactions --repeat times;
+the baseline is what the LLM wrote before: an ILIKE '%term%' count/sum plus
+the newest page, and ilike_matches shows what it found. The fuzzy vocabulary is loaded once up front and reported
+on its own, since it is cached per data version.
+"""
+import argparse
+import json
+import statistics
+import time
+
+# (name, query, page)
+CASES = [
+    ("exact", "amazon", 1),
+    ("prefix", "amaz", 1),
+    ("two words", "cafe coffee", 1),
+    ("typo", "amazn", 1),
+    ("typo, two words", "cafe cofee", 1),
+    ("no match", "qwerty", 1),
+    ("deep page", "swiggy", 200),
+]
+
+BASELINE_SQL = [
+    "SELECT count(*), sum(abs(amount)) FROM transactions WHERE description ILIKE %(p)s",
+    "SELECT id, date, amount, category, description FROM transactions WHERE description ILIKE %(p)s "
+    "ORDER BY date DESC, id DESC LIMIT 20 OFFSET %(offset)s",
+]
+
+
+def _timings(fn, repeat):
+    out = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def _ms(values, q):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+
+def run(repeat=20):
+    from agents.db import connection
+    from agents.search import search_transactions, vocabulary
+
+    with connection() as conn:
+        rows = conn.execute("SELECT count(*) FROM transactions").fetchone()[0]
+        start = time.perf_counter()
+        words = len(vocabulary(conn))
+        vocabulary_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def baseline(query, page):
+        params = {"p": f"%{query}%", "offset": (page - 1) * 20}
+        with connection() as conn:
+            count = conn.execute(BASELINE_SQL[0], params).fetchone()[0]
+            conn.execute(BASELINE_SQL[1], params).fetchall()
+        return count
+
+    results = []
+    for name, query, page in CASES:
+        found = search_transactions(query, page)
+        search = _timings(lambda: search_transactions(query, page), repeat)
+        ilike = _timings(lambda: baseline(query, page), max(1, repeat // 4))
+        results.append({
+            "case": name,
+            "query": query,
+            "page": page,
+            "matches": found["matches"],
+            "fuzzy": found["fuzzy"],
+            "search_p50_ms": _ms(search, 0.5),
+            "search_p95_ms": _ms(search, 0.95),
+            "ilike_matches": baseline(query, page),
+            "ilike_p50_ms": _ms(ilike, 0.5),
+            "speedup": round(statistics.median(ilike) / statistics.median(search), 1),
+        })
+    return {"rows": rows, "vocabulary_words": words, "vocabulary_load_ms": vocabulary_ms, "results": results}
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=0)
+    parser.add_argument("--reset", action="store_true")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.rows:
+        from agents.db import connection
+        from benchmarks.synthetic import load
+        report = load(args.rows, reset=args.reset)
+        print(f"Loaded {report['inserted']} synthetic transactions in {report['seconds']}s")
+        with connection() as conn:
+            conn.execute("ANALYZE transactions")
+
+    result = run(args.repeat)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['rows']} rows, {result['vocabulary_words']} vocabulary words "
+          f"loaded in {result['vocabulary_load_ms']} ms")
+    print(f"{'case':<18} {'query':<12} {'page':>4} {'matches':>8} {'p50':>8} {'p95':>8} "
+          f"{'ilike':>8} {'ilike_matches':>13} {'x':>6}")
+    for r in result["results"]:
+        print(f"{r['case']:<18} {r['query']:<12} {r['page']:>4} {r['matches']:>8} {r['search_p50_ms']:>8} "
+              f"{r['search_p95_ms']:>8} {r['ilike_p50_ms']:>8} {r['ilike_matches']:>13} {r['speedup']:>6}")
+
+
+if __name__ == "__main__":
+    main()
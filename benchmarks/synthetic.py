@@ -0,0 +1,80 @@
+"""Deterministic synthetic transaction history for benchmarks.
+
+    python -m benchmarks.synthetic --rows 100000 [--months 24] [--seed 0] [--reset]
+
+Loads --rows transactions spread over the last --months months into
+DATABASE_URL through the COPY ingestion path. --reset truncates
+`transactions` first; never point it at a database you care about.
+"""
+import argparse
+import datetime
+import random
+
+# (category, share of rows, typical amount, merchants)
+PROFILE = [
+    ("Food", 0.28, 350, ["SWIGGY", "ZOMATO", "DOMINOS PIZZA", "CAFE COFFEE DAY", "MCDONALDS"]),
+    ("Groceries", 0.16, 1200, ["BIGBASKET", "BLINKIT", "DMART", "ZEPTO", "RELIANCE FRESH"]),
+    ("Transport", 0.14, 250, ["UBER INDIA", "OLA CABS", "RAPIDO", "DELHI METRO", "HPCL FUEL"]),
+    ("Shopping", 0.12, 1800, ["AMAZON PAY", "FLIPKART", "MYNTRA", "AJIO"]),
+    ("Entertainment", 0.06, 500, ["NETFLIX", "SPOTIFY", "BOOKMYSHOW", "HOTSTAR"]),
+    ("Utilities", 0.06, 900, ["AIRTEL BROADBAND", "JIO RECHARGE", "ELECTRICITY BILL", "GAS BILL"]),
+    ("Healthcare", 0.04, 700, ["APOLLO PHARMACY", "MEDPLUS", "CITY CLINIC"]),
+    ("Housing", 0.02, 25000, ["RENT TRANSFER", "SOCIETY MAINTENANCE"]),
+    ("Cash", 0.04, 2000, ["ATM CASH WITHDRAWAL"]),
+    ("Self Transfer", 0.04, 5000, ["TO SELF SAVINGS", "OWN ACCOUNT TRANSFER"]),
+    ("Money Received", 0.03, 3000, ["UPI RECEIVED", "NEFT CREDIT"]),
+    ("Salary", 0.01, 80000, ["SALARY ACME CORP"]),
+]
+
+INCOME = {"Money Received", "Salary"}
+
+
+def synthetic_transactions(n: int, months: int = 24, seed: int = 0, end: datetime.date = None):
+    """Yield `n` transaction dicts, the same ones for the same arguments."""
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    span = months * 30
+    categories = [p[0] for p in PROFILE]
+    weights = [p[1] for p in PROFILE]
+    by_name = {p[0]: p for p in PROFILE}
+    for _ in range(n):
+        category = rng.choices(categories, weights)[0]
+        _, _, typical, merchants = by_name[category]
+        amount = round(rng.lognormvariate(0, 0.6) * typical, 2)
+        merchant = rng.choice(merchants)
+        ref = rng.randrange(10**6, 10**7)
+        yield {
+            "date": (end - datetime.timedelta(days=rng.randrange(span))).isoformat(),
+            "description": f"UPI-{merchant}-{ref}",
+            "amount": amount if category in INCOME else -amount,
+            "category": category,
+        }
+
+
+def load(rows: int, months: int = 24, seed: int = 0, reset: bool = False) -> dict:
+    from agents.db import connection
+    from agents.ingest import copy_transactions
+
+    if reset:
+        with connection() as conn:
+            conn.execute("TRUNCATE transactions RESTART IDENTITY")
+    return copy_transactions(synthetic_transactions(rows, months, seed))
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+
+    report = load(args.rows, args.months, args.seed, args.reset)
+    print(f"Inserted {report['inserted']} rows in {report['seconds']}s ({report['rows_per_sec']} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
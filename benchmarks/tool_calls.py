@@ -0,0 +1,96 @@
+"""Wall time of one agent step with several tool calls, serial vs parallel.
+
+    python -m benchmarks.tool_calls [--calls 4] [--latency 0.2] [--repeat 5] [--sql] [--json]
+
+Feeds the graph's tool node an AIMessage carrying --calls tool calls, as
+Gemini does when it asks for several PDFs or queries at once. "serial" runs
+the calls one per node invocation, back to back; "parallel" hands them all to
+the node in one message. The default tool sleeps for --latency seconds to
+stand in for I/O; --sql runs `SELECT pg_sleep(latency)` through
+run_sql_query_tool against DATABASE_URL instead.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agents.tool_executor import ToolExecutor
+
+
+def _sleep_tool(latency):
+    @tool
+    def slow_lookup(i: int) -> str:
+        """Pretend to fetch record i from a slow service."""
+        time.sleep(latency)
+        return f"record {i}"
+    return slow_lookup
+
+
+def _calls(n, latency, sql):
+    if sql:
+        # a fresh literal per call so the SQL result cache can't answer it
+        return [{"name": "run_sql_query_tool", "id": uuid.uuid4().hex, "type": "tool_call",
+                 "args": {"query": f"SELECT pg_sleep({latency}), '{uuid.uuid4().hex}'"}}
+                for _ in range(n)]
+    return [{"name": "slow_lookup", "id": uuid.uuid4().hex, "type": "tool_call", "args": {"i": i}}
+            for i in range(n)]
+
+
+def _step(node, calls):
+    start = time.perf_counter()
+    out = node.invoke({"messages": [AIMessage(content="", tool_calls=calls)]})
+    assert [m.tool_call_id for m in out["messages"]] == [c["id"] for c in calls]
+    return time.perf_counter() - start
+
+
+def run(calls=4, latency=0.2, repeat=5, sql=False):
+    if sql:
+        from agents.database_agent import run_sql_query_tool
+        node = ToolExecutor([run_sql_query_tool])
+    else:
+        node = ToolExecutor([_sleep_tool(latency)])
+
+    serial, parallel = [], []
+    for _ in range(repeat):
+        batch = _calls(calls, latency, sql)
+        serial.append(sum(_step(node, [c]) for c in batch))
+        parallel.append(_step(node, _calls(calls, latency, sql)))
+
+    s, p = statistics.median(serial), statistics.median(parallel)
+    return {
+        "tool": "run_sql_query_tool" if sql else "slow_lookup",
+        "calls_per_step": calls,
+        "tool_latency_s": latency,
+        "serial_ms_median": round(s * 1000, 1),
+        "parallel_ms_median": round(p * 1000, 1),
+        "speedup": round(s / p, 2) if p else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sql", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.sql:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    result = run(args.calls, args.latency, args.repeat, args.sql)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for k, v in result.items():
+            print(f"{k:>20}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+
+
+# Read automatically by `gunicorn app:app` (Procfile) and `gunicorn asgi:app`.
+# Importing the app opens no connections, so it is safe to load once in the
+# master: workers are forked with the agent stack already imported (shared
+# copy-on-write) and each one opens its own DB pool and LLM client on first
+# use. Schema and checkpointer setup run in the release phase
+# (`python -m agents.migrations`), never in a worker.
+#
+# numpy's BLAS (OpenBLAS/MKL) starts a thread pool when it is imported, and
+# threads don't survive a fork. This file is read before the app is loaded,
+# so capping them at one here means the preload starts none; parallelism
+# comes from the workers. Set them explicitly to override.
+for _var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # runs in the master after the app is loaded and before workers fork
+    if preload_app:
+        import app
+        app.warm_imports()
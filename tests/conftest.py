@@ -0,0 +1,27 @@
+import os
+import uuid
+
+import pytest
+
+
+def _schema():
+    """A connection whose search_path is a throwaway schema, dropped afterwards."""
+    psycopg = pytest.importorskip("psycopg")
+    name = "test_" + uuid.uuid4().hex[:12]
+    with psycopg.connect(os.environ["DATABASE_URL"], autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {name}")
+        try:
+            conn.execute(f"SET search_path TO {name}")
+            yield conn
+        finally:
+            conn.execute(f"DROP SCHEMA {name} CASCADE")
+
+
+@pytest.fixture
+def schema():
+    yield from _schema()
+
+
+@pytest.fixture(scope="module")
+def module_schema():
+    yield from _schema()
@@ -0,0 +1,88 @@
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from agents import analytics
+from agents.analytics import COLUMNS, _anomalies, _frame, _monthly_summary, _refresh, spending_anomalies
+from agents.migrations import migrate
+
+needs_db = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+
+
+def frame(rows):
+    """rows of (date, amount, category, merchant, is_spend) -> an analytics frame."""
+    df = pd.DataFrame([(i + 1, d.isoformat(), *r) for i, (d, *r) in enumerate(rows)], columns=COLUMNS)
+    for col in ("category", "merchant"):
+        df[col] = df[col].astype("category")
+    return _frame(df)
+
+
+def months_ago(n):
+    first = date.today().replace(day=1)
+    for _ in range(n):
+        first = (first - timedelta(days=1)).replace(day=1)
+    return first
+
+
+def test_monthly_summary_counts_spend_only():
+    df = frame([
+        (months_ago(1), -300.0, "Food", "swiggy", True),
+        (months_ago(1), 50000.0, "Salary", "acme", False),
+        (months_ago(0), -100.0, "Food", "swiggy", True),
+        (months_ago(0), -200.0, "Shopping", "amazon", True),
+    ])
+    summary = _monthly_summary(df, 2)
+
+    assert [(m["total"], m["count"]) for m in summary["months"]] == [(300.0, 1), (300.0, 2)]
+    assert summary["months"][1]["change_pct"] == 0.0
+    assert summary["average"] == 300.0
+
+
+def test_anomalies_flag_recent_outliers_in_their_category():
+    today = date.today()
+    usual = [(today - timedelta(days=d), -100.0 - d % 7, "Food", "swiggy", True) for d in range(1, 60)]
+    df = frame(usual + [
+        (today - timedelta(days=2), -5000.0, "Food", "fancy", True),
+        (today - timedelta(days=400), -4000.0, "Food", "fancy", True),
+        (today - timedelta(days=3), -5000.0, "Self Transfer", "", False),
+    ])
+    result = _anomalies(df, 90, 3.5, 20)
+
+    assert [(a["merchant"], a["amount"]) for a in result["anomalies"]] == [("fancy", 5000.0)]
+    assert result["anomalies"][0]["typical"] < 110
+
+
+def test_near_identical_thresholds_share_a_memo_entry(monkeypatch):
+    snap = analytics.Snapshot(1, 0, 1, frame([(date.today(), -100.0, "Food", "swiggy", True)]),
+                              analytics.LRUCache(maxsize=4))
+    monkeypatch.setattr(analytics, "snapshot", lambda: snap)
+    for threshold in (3.5, 3.50001, 3.54999, 1e9):
+        spending_anomalies(threshold=threshold)
+    assert len(snap.results) == 2
+
+
+@needs_db
+def test_refresh_appends_above_the_id_watermark(schema):
+    migrate(schema)
+    insert = "INSERT INTO transactions (date, amount, category, description) VALUES (%s, %s, %s, %s)"
+    schema.execute(insert, ("2025-03-01", -100, "Food", "SWIGGY"))
+    schema.execute(insert, ("2025-03-02", -200, "Food", "ZOMATO"))
+    snap = _refresh(schema, None)
+    assert len(snap.frame) == 2
+
+    # a back-dated row still has a new id, so it is appended
+    schema.execute(insert, ("2024-12-31", -300, "Shopping", "AMAZON"))
+    loads = analytics.metrics.counts(analytics.EVENTS_METRIC, analytics.EVENTS)
+    snap = _refresh(schema, snap)
+    after = analytics.metrics.counts(analytics.EVENTS_METRIC, analytics.EVENTS)
+    assert after["incremental_loads"] == loads["incremental_loads"] + 1
+    assert sorted(snap.frame["amount"]) == [-300.0, -200.0, -100.0]
+
+    # a delete moves the rewrite version: reload everything
+    schema.execute("DELETE FROM transactions WHERE description = 'ZOMATO'")
+    snap = _refresh(schema, snap)
+    after_delete = analytics.metrics.counts(analytics.EVENTS_METRIC, analytics.EVENTS)
+    assert after_delete["full_loads"] == after["full_loads"] + 1
+    assert sorted(snap.frame["amount"]) == [-300.0, -100.0]
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+
+import pytest
+
+import app as app_module
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+        return self
+
+    def fetchall(self):
+        return []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    version = {"now": 7}
+    monkeypatch.setattr(app_module, "current_data_version", lambda: (version["now"], None))
+    app_module._chart_cache.clear()
+    client = app_module.app.test_client()
+    client.version = version
+    return client
+
+
+def use_connection(monkeypatch, conn):
+    @contextmanager
+    def connection():
+        if conn is None:
+            raise OSError("database is down")
+        yield conn
+    monkeypatch.setattr(app_module, "connection", connection)
+
+
+def test_revalidation_gets_a_304_until_the_data_changes(client, monkeypatch):
+    conn = FakeConnection()
+    use_connection(monkeypatch, conn)
+
+    first = client.get("/expenses-data")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert "Last-Modified" not in first.headers
+    assert client.get("/expenses-data").get_json() == first.get_json()
+    assert conn.queries == 1
+
+    etag = first.headers["ETag"]
+    assert client.get("/expenses-data", headers={"If-None-Match": etag}).status_code == 304
+
+    client.version["now"] += 1
+    changed = client.get("/expenses-data", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert conn.queries == 2
+
+
+def test_fallback_data_is_not_cached(client, monkeypatch):
+    use_connection(monkeypatch, None)
+
+    response = client.get("/expenses-data")
+    assert response.status_code == 200 and response.get_json()["values"]
+    assert "no-store" in response.headers["Cache-Control"]
+    assert "ETag" not in response.headers
+    assert not app_module._chart_cache
@@ -0,0 +1,72 @@
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph.message import add_messages
+
+from agents.chatbot import context_tokens, plan_context_trim
+
+
+def conversation(turns, start=0):
+    messages = []
+    for i in range(start, start + turns):
+        messages.append(HumanMessage(f"question {i} about my spending", id=f"h{i}"))
+        messages.append(AIMessage(f"answer {i}: " + "details " * 40, id=f"a{i}"))
+    return messages
+
+
+def trim(thread, store, budget=400, keep_recent=4):
+    updates, archived = plan_context_trim(thread, budget, keep_recent)
+    store.update(archived)
+    return add_messages(thread, updates)
+
+
+def refs_in(text):
+    return re.findall(r"^(\S+)  ", text, re.MULTILINE)
+
+
+def test_dropped_turns_leave_a_placeholder_with_recallable_refs():
+    store = {}
+    thread = trim(conversation(8), store)
+
+    placeholder = thread[0]
+    assert placeholder.id == "h0"
+    assert "'question 0 about my spending'" in placeholder.content
+    index_ref = placeholder.additional_kwargs["context_ref"]
+    assert f"ref={index_ref}" in placeholder.content
+
+    listed = refs_in(store[index_ref]["content"])
+    kept = {m.id for m in thread[1:]}
+    assert listed and all(ref in store for ref in listed)
+    assert {ref.split(":", 1)[1] for ref in listed}.isdisjoint(kept)
+    assert store["human:h0"]["content"] == "question 0 about my spending"
+
+
+def test_a_later_trim_chains_to_the_earlier_index():
+    store = {}
+    thread = trim(conversation(8), store)
+    first_index = thread[0].additional_kwargs["context_ref"]
+
+    thread = trim(thread + conversation(8, start=8), store)
+
+    second_index = thread[0].additional_kwargs["context_ref"]
+    assert second_index != first_index
+    assert first_index in refs_in(store[second_index]["content"])
+    # the original text isn't overwritten by the placeholder that replaced it
+    assert store["human:h0"]["content"] == "question 0 about my spending"
+
+
+def test_a_huge_recent_tool_output_is_stubbed():
+    store = {}
+    rows = "2025-04-02,-450.00,Food,UPI-SWIGGY\n" * 20000
+    thread = conversation(1) + [
+        HumanMessage("show all my transactions", id="h1"),
+        AIMessage("", id="a1", tool_calls=[{"name": "run_sql_query_tool", "args": {}, "id": "call1"}]),
+        ToolMessage(rows, id="t1", tool_call_id="call1"),
+    ]
+    thread = trim(thread, store, budget=2000)
+
+    tool = thread[-1]
+    ref = tool.additional_kwargs["context_ref"]
+    assert f"ref={ref}" in tool.content and tool.tool_call_id == "call1"
+    assert store[ref]["content"] == rows
+    assert context_tokens(thread) <= 2000
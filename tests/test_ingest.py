@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+import pytest
+
+from agents.ingest import coerce_transaction, parse_amount
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Rs. 1,234.50", Decimal("1234.50")),
+    ("(450.00)", Decimal("-450.00")),
+    (12, Decimal("12")),
+    (-3.5, Decimal("-3.5")),
+    (Decimal("7.25"), Decimal("7.25")),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    True, False, float("nan"), float("inf"), Decimal("NaN"), Decimal("-Infinity"), "NaN", "abc", "",
+])
+def test_parse_amount_rejects_non_finite_and_non_numbers(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
+
+
+def test_bad_amount_rejects_the_row_not_the_load():
+    # copy_transactions only catches ValueError/TypeError per row
+    for amount in (True, float("nan")):
+        with pytest.raises(ValueError):
+            coerce_transaction({"amount": amount, "date": "2025-04-01"})
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from agents.ingest import COPY_SQL, FINGERPRINT_SQL, INSERT_SQL, SKIPPED_SQL, STAGING_SQL
+from agents.migrations import EXPLAIN_QUERIES, MIGRATIONS, explain_queries, migrate
+from agents.rollup import REBUILD_SQL
+from agents.statement_parser import categorize
+
+psycopg = pytest.importorskip("psycopg")
+
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+
+ROWS = 200_000
+
+# About ten years of history: 40 categories, a few thousand merchants (letters
+# only, so normalize_merchant keeps them apart) and an occasional Amazon order.
+LOAD_SQL = """
+    INSERT INTO transactions (date, amount, category, description)
+    SELECT date '2015-12-31' + (i %% 3650),
+           -round((1 + (i * 7919) %% 250000) / 100.0, 2),
+           CASE WHEN i %% 40 = 0 THEN 'Food' ELSE 'Category ' || i %% 40 END,
+           CASE WHEN i %% 500 = 0 THEN 'UPI-AMAZON PAY-' || i
+                ELSE 'POS ' || upper(translate(left(md5((i %% 3000)::text), 10), '0123456789', 'ghijklmnop'))
+           END
+    FROM generate_series(1, %s) AS i
+"""
+
+
+@pytest.fixture(scope="module")
+def loaded(module_schema):
+    migrate(module_schema)
+    module_schema.execute(LOAD_SQL, (ROWS,))
+    module_schema.execute("ANALYZE transactions")
+    module_schema.execute("ANALYZE expense_rollup")
+    return module_schema
+
+
+def test_migrate_applies_every_version_once(schema):
+    assert migrate(schema) == [v for v, _, _ in MIGRATIONS]
+    assert migrate(schema) == []
+
+
+def test_migrate_upgrades_a_table_that_predates_it(schema):
+    schema.execute("CREATE TABLE transactions (date DATE, amount NUMERIC, description TEXT)")
+    schema.execute("INSERT INTO transactions VALUES ('2025-04-02', -450, 'UPI-SWIGGY-1234'), "
+                   "('2025-04-02', -450, 'UPI-SWIGGY-1234')")
+
+    migrate(schema)
+
+    rows = schema.execute("SELECT id, category, merchant, fingerprint FROM transactions ORDER BY id").fetchall()
+    assert [r[0] for r in rows] == [1, 2]
+    assert {r[2] for r in rows} == {"swiggy"}
+    assert rows[0][3] != rows[1][3]
+    assert schema.execute("SELECT count(*) FROM pg_index WHERE indrelid = 'transactions'::regclass "
+                          "AND indisprimary").fetchone()[0] == 1
+
+
+@pytest.mark.parametrize("name", list(EXPLAIN_QUERIES))
+def test_dashboard_queries_use_indexes(loaded, name):
+    result = explain_queries(loaded)[name]
+    assert result["uses_index"], f"{name}: {'; '.join(result['scans'])}"
+
+
+def test_rollup_trigger_and_rebuild_count_the_same_rows(schema):
+    migrate(schema)
+    schema.execute("""
+        INSERT INTO transactions (date, amount, category, description) VALUES
+            ('2025-04-02', -450, 'Food', 'SWIGGY'),
+            ('2025-04-03', -1200, 'Shopping', 'AMAZON'),
+            ('2025-04-05', 50000, 'Money Received', 'ACME PAYROLL'),
+            ('2025-04-06', -5000, 'Self Transfer', 'TO SELF'),
+            ('2025-05-01', -300, 'food', 'ZOMATO')
+    """)
+    schema.execute("UPDATE transactions SET category = 'Transfers' WHERE description = 'AMAZON'")
+    schema.execute("DELETE FROM transactions WHERE description = 'ZOMATO'")
+
+    rollup_sql = "SELECT month, category, total, txn_count FROM expense_rollup WHERE txn_count <> 0 ORDER BY 1, 2"
+    from_triggers = schema.execute(rollup_sql).fetchall()
+    schema.execute("DELETE FROM expense_rollup")
+    schema.execute(REBUILD_SQL)
+
+    assert from_triggers == schema.execute(rollup_sql).fetchall()
+    assert [(r[1], r[2]) for r in from_triggers] == [("Food", 450)]
+
+
+def test_salary_credit_does_not_reach_the_rollup(schema):
+    migrate(schema)
+    for description, amount in [("NEFT-ACME CORP SALARY", 50000), ("AMAZON REFUND", 1200), ("UPI-SWIGGY-1234", -450)]:
+        schema.execute(
+            "INSERT INTO transactions (date, amount, category, description) VALUES ('2025-04-05', %s, %s, %s)",
+            (amount, categorize(description, amount), description),
+        )
+
+    rows = schema.execute("SELECT category, total FROM expense_rollup WHERE txn_count <> 0").fetchall()
+    assert rows == [("Food", 450)]
+
+
+def test_rows_inserted_without_a_fingerprint_count_as_loaded(schema):
+    migrate(schema)
+    row = ("2025-04-02", -120, "CAFE COFFEE DAY")
+    insert = "INSERT INTO transactions (date, amount, description) VALUES (%s, %s, %s)"
+    schema.execute(insert, row)
+    schema.execute(insert, row)
+    fingerprints = [r[0] for r in schema.execute("SELECT fingerprint FROM transactions").fetchall()]
+    assert None not in fingerprints and len(set(fingerprints)) == 2
+
+    # importing the same row again skips it and says so
+    with schema.transaction():
+        schema.execute(STAGING_SQL)
+        with schema.cursor().copy(COPY_SQL) as copy:
+            copy.write_row((row[1], None, row[0], row[2], None))
+        schema.execute(FINGERPRINT_SQL)
+        inserted, first_id, last_id = schema.execute(INSERT_SQL).fetchone()
+        skipped = schema.execute(SKIPPED_SQL, (first_id or 0, last_id or 0, 20)).fetchall()
+    assert inserted == 0
+    assert [(str(d), int(a), desc) for d, a, desc in skipped] == [row]
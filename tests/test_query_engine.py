@@ -0,0 +1,25 @@
+import pytest
+
+from agents.query_engine import is_read_query
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM transactions",
+    "WITH x AS (SELECT * FROM transactions WHERE description ILIKE '%update%') SELECT * FROM x",
+    "-- delete these later\nSELECT 1",
+    "/* merge */ WITH a AS (SELECT 1) SELECT * FROM a",
+    "WITH a AS (SELECT $$insert$$) SELECT * FROM a",
+    'WITH a AS (SELECT "delete" FROM t) SELECT * FROM a',
+])
+def test_reads(query):
+    assert is_read_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "UPDATE transactions SET category = 'Food'",
+    "WITH d AS (DELETE FROM transactions RETURNING *) SELECT * FROM d",
+    "with moved as (update transactions set category = 'x' returning id) select count(*) from moved",
+    "/* SELECT */ DELETE FROM transactions",
+])
+def test_writes(query):
+    assert not is_read_query(query)
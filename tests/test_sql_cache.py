@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+
+import pytest
+
+from agents import database_agent
+from agents.database_agent import _cached_query, normalize_sql
+
+
+class FakeDatabase:
+    """Stands in for the pool: a data version and a count of queries run."""
+
+    def __init__(self):
+        self.version = 1
+        self.runs = 0
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def current_data_version(self, conn):
+        assert conn is self
+        return self.version, None
+
+    def run_query(self, query, params=None, conn=None):
+        assert conn is self
+        self.runs += 1
+        return {"rows": [[self.runs]]}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(database_agent, "connection", fake.connection)
+    monkeypatch.setattr(database_agent, "current_data_version", fake.current_data_version)
+    monkeypatch.setattr(database_agent, "run_query", fake.run_query)
+    monkeypatch.setattr(database_agent, "_other_relations", {"users", "spending_forecasts", "store"})
+    database_agent._sql_cache.clear()
+    return fake
+
+
+def test_normalize_sql_folds_case_and_space_but_not_literals():
+    assert normalize_sql("SELECT  SUM(amount)\n FROM Transactions WHERE category = 'Food';") == \
+        "select sum(amount) from transactions where category = 'Food'"
+    assert normalize_sql("select 'A  B'") != normalize_sql("select 'a b'")
+    assert normalize_sql('SELECT "Amount" FROM t') == 'select "Amount" from t'
+
+
+def test_a_reformatted_read_hits_the_cache(db):
+    first = _cached_query("SELECT SUM(amount) FROM transactions", None)
+    assert _cached_query("select sum(amount)\n  from transactions;", None) == first
+    assert db.runs == 1
+    _cached_query("SELECT SUM(amount) FROM transactions WHERE category = %s", ["Food"])
+    assert db.runs == 2
+
+
+def test_a_new_data_version_misses(db):
+    _cached_query("SELECT SUM(amount) FROM transactions", None)
+    db.version += 1
+    _cached_query("SELECT SUM(amount) FROM transactions", None)
+    assert db.runs == 2
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM spending_forecasts",
+    "SELECT t.amount FROM transactions t JOIN users u ON u.id = 1",
+    'SELECT * FROM transactions, "store"',
+    "SELECT count(*) FROM pg_stat_activity, transactions",
+    "SELECT amount, random() FROM transactions",
+    "SELECT 1",
+])
+def test_queries_outside_the_versioned_tables_always_run(db, query):
+    _cached_query(query, None)
+    _cached_query(query, None)
+    assert db.runs == 2
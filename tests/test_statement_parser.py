@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from agents.statement_parser import categorize, parse_statement
+
+STATEMENT = """\
+HDFC BANK  Statement of account  01/04/2025 - 30/04/2025
+Date        Narration                          Amount       Balance
+01/04/2025  Opening Balance                                 10,000.00
+02/04/2025  UPI-SWIGGY-1234                    450.00       9,550.00
+05/04/2025  NEFT-ACME CORP SALARY              50,000.00    59,550.00
+09/04/2025  POS AMAZON PAY                     1,200.00     58,350.00
+30/04/2025  Total                              1,650.00     50,000.00
+30/04/2025  Closing Balance                                 58,350.00
+"""
+
+
+def parse_text(tmp_path, text):
+    path = tmp_path / "statement.txt"
+    path.write_text(text, encoding="utf-8")
+    unparsed = []
+    return list(parse_statement(str(path), unparsed)), unparsed
+
+
+def test_balance_and_total_lines_are_not_transactions(tmp_path):
+    rows, unparsed = parse_text(tmp_path, STATEMENT)
+
+    assert [(r["description"], r["amount"]) for r in rows] == [
+        ("UPI-SWIGGY-1234", Decimal("-450.00")),
+        ("NEFT-ACME CORP SALARY", Decimal("50000.00")),
+        ("POS AMAZON PAY", Decimal("-1200.00")),
+    ]
+    assert unparsed == []
+
+
+def test_opening_balance_signs_the_first_transaction(tmp_path):
+    # no Dr/Cr and no credit hint: only the opening balance says 500 came in
+    rows, _ = parse_text(tmp_path, "01/04/2025 Opening Balance 10,000.00\n"
+                                   "02/04/2025 IMPS-R SHARMA 500.00 10,500.00\n")
+
+    assert [r["amount"] for r in rows] == [Decimal("500.00")]
+
+
+def test_balance_brought_forward_is_skipped(tmp_path):
+    rows, unparsed = parse_text(tmp_path, "01-Apr-2025 Balance B/F 2,000.00 Cr\n"
+                                          "01-Apr-2025 B/F 2,000.00\n"
+                                          "03-Apr-2025 ATM CASH WITHDRAWAL 1,000.00 1,000.00\n")
+
+    assert [(r["category"], r["amount"]) for r in rows] == [("Cash", Decimal("-1000.00"))]
+    assert unparsed == []
+
+
+def test_credits_are_income_and_debits_are_spend():
+    assert categorize("NEFT-ACME CORP SALARY", Decimal("50000")) == "Salary"
+    assert categorize("AMAZON PAY REFUND", Decimal("1200")) == "Refund"
+    assert categorize("UPI-SWIGGY-1234", Decimal("450")) == "Money Received"
+    assert categorize("SALARY ADVANCE EMI", Decimal("-5000")) == "Other"
+    assert categorize("UPI-SWIGGY-1234", Decimal("-450")) == "Food"
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agents import tool_executor
+from agents.tool_executor import ToolExecutor
+
+running = {"now": 0, "peak": 0}
+lock = threading.Lock()
+
+
+@tool
+def nap(seconds: float) -> str:
+    """Sleep for `seconds` and say so."""
+    with lock:
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+    try:
+        time.sleep(seconds)
+    finally:
+        with lock:
+            running["now"] -= 1
+    return f"slept {seconds}"
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setitem(tool_executor.TOOL_LIMITS, "nap", (1.0, 2))
+    monkeypatch.setattr(tool_executor, "_semaphores", {})
+    running.update(now=0, peak=0)
+
+
+def step(*seconds):
+    return {"messages": [AIMessage("", tool_calls=[
+        {"name": "nap", "args": {"seconds": s}, "id": f"call{i}"} for i, s in enumerate(seconds)])]}
+
+
+@pytest.mark.parametrize("run", [
+    lambda node, state: node.invoke(state),
+    lambda node, state: asyncio.run(node.ainvoke(state)),
+], ids=["sync", "async"])
+def test_results_come_back_in_call_order_within_the_tool_limit(run):
+    out = run(ToolExecutor([nap]), step(0.3, 0.1, 0.2, 0.0))
+
+    assert [m.tool_call_id for m in out["messages"]] == ["call0", "call1", "call2", "call3"]
+    assert [m.content for m in out["messages"]] == ["slept 0.3", "slept 0.1", "slept 0.2", "slept 0.0"]
+    assert running["peak"] == 2
+
+
+@pytest.mark.parametrize("run", [
+    lambda node, state: node.invoke(state),
+    lambda node, state: asyncio.run(node.ainvoke(state)),
+], ids=["sync", "async"])
+def test_a_call_past_its_timeout_is_answered_with_an_error(run):
+    start = time.monotonic()
+    out = run(ToolExecutor([nap]), step(0.1, 3.0))
+
+    assert time.monotonic() - start < 2
+    ok, late = out["messages"]
+    assert ok.content == "slept 0.1"
+    assert late.status == "error" and "did not finish within 1s" in late.content